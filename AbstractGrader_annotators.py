@@ -0,0 +1,105 @@
+import argparse
+import itertools
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from AbstractGrader_io import read_data_file, write_data_file
+
+def shard_mask(index, reviewers, reviewer, overlap=0.0):
+    # Rows assigned to one reviewer (1-based) out of `reviewers`. The assignment only depends on the row key,
+    # so every reviewer computes the same split from their own copy of the file without coordination.
+    # A share of `overlap` rows is assigned to all reviewers so their agreement can be measured.
+    hashes = pd.util.hash_pandas_object(pd.Series(index), index=False).to_numpy()
+    in_shard = (hashes % np.uint64(reviewers)) == np.uint64(reviewer - 1)
+    shared = ((hashes >> np.uint64(32)) % np.uint64(10000)) < np.uint64(round(overlap * 10000))
+    return in_shard | shared
+
+def cohen_kappa(a, b):
+    # Agreement of two raters over the rows both have labelled
+    both = a.notna() & b.notna()
+    a, b = a[both].astype(str), b[both].astype(str)
+    if len(a) == 0:
+        return float("nan")
+    codes, categories = pd.factorize(pd.concat([a, b], ignore_index=True))
+    codes_a, codes_b = codes[:len(a)], codes[len(a):]
+    observed = np.mean(codes_a == codes_b)
+    share_a = np.bincount(codes_a, minlength=len(categories)) / len(a)
+    share_b = np.bincount(codes_b, minlength=len(categories)) / len(b)
+    expected = np.sum(share_a * share_b)
+    return 1.0 if expected == 1 else (observed - expected) / (1 - expected)
+
+def fleiss_kappa(labels):
+    # Agreement of all raters (columns) over the rows every rater has labelled
+    labels = labels[labels.notna().all(axis=1)].astype(str)
+    raters = labels.shape[1]
+    if len(labels) == 0 or raters < 2:
+        return float("nan")
+    codes, categories = pd.factorize(labels.to_numpy().ravel())
+    codes = codes.reshape(labels.shape)
+    # Rows x categories matrix of how many raters gave each label
+    counts = np.zeros((len(labels), len(categories)))
+    for rater in range(raters):
+        counts[np.arange(len(labels)), codes[:, rater]] += 1
+    row_agreement = (np.sum(counts ** 2, axis=1) - raters) / (raters * (raters - 1))
+    observed = row_agreement.mean()
+    expected = np.sum((counts.sum(axis=0) / counts.sum()) ** 2)
+    return 1.0 if expected == 1 else (observed - expected) / (1 - expected)
+
+def merge_reviews(sources):
+    # sources is a list of (file path, output column). The files are copies of the same dataset, rows are
+    # matched by position. Returns the first file with one output column per reviewer.
+    merged = None
+    reviewer_columns = []
+    for number, (file_path, column) in enumerate(sources, start=1):
+        data = read_data_file(file_path)
+        reviewer = f"{column}_{os.path.splitext(os.path.basename(file_path))[0]}"
+        if merged is None:
+            merged = data.drop(columns=[column])
+        elif len(data) != len(merged):
+            raise ValueError(f"{file_path} has {len(data)} rows, expected {len(merged)}.")
+        if reviewer in merged.columns:
+            # Reviewers usually grade copies of the same file, with the same name
+            reviewer = f"{reviewer}_{number}"
+        if reviewer in merged.columns:
+            raise ValueError(f"Column {reviewer} for {file_path} exists already.")
+        merged[reviewer] = data[column].to_numpy()
+        reviewer_columns.append(reviewer)
+    return merged, reviewer_columns
+
+def agreement_report(merged, reviewer_columns):
+    lines = []
+    for a, b in itertools.combinations(reviewer_columns, 2):
+        both = (merged[a].notna() & merged[b].notna()).sum()
+        lines.append(f"Cohen's kappa {a} / {b}: {cohen_kappa(merged[a], merged[b]):.3f} ({both} rows)")
+    if len(reviewer_columns) > 2:
+        labels = merged[reviewer_columns]
+        complete = labels.notna().all(axis=1).sum()
+        lines.append(f"Fleiss' kappa (all reviewers): {fleiss_kappa(labels):.3f} ({complete} rows)")
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the output columns of several reviewers and report their agreement.")
+    parser.add_argument("sources", nargs="+", help="reviewer files, as FILE or FILE:COLUMN")
+    parser.add_argument("--column", help="output column, if it is the same in all files")
+    parser.add_argument("--output", help="file to write the merged data to (.csv, .feather or .parquet)")
+    args = parser.parse_args(argv)
+
+    sources = []
+    for source in args.sources:
+        file_path, _, column = source.rpartition(":") if ":" in os.path.basename(source) else (source, "", None)
+        column = column or args.column
+        if not column:
+            parser.error(f"no output column given for {source}")
+        sources.append((file_path, column))
+
+    merged, reviewer_columns = merge_reviews(sources)
+    for line in agreement_report(merged, reviewer_columns):
+        print(line)
+    if args.output:
+        write_data_file(merged, args.output)
+        print(f"Merged data written to {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
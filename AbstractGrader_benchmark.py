@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import shutil
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from AbstractGrader_perf import _peak_rss
+
+# Benchmarks of the grading loop on synthetic data. The real main window is driven without a display
+# through Qt's offscreen platform, so the numbers include the widget updates:
+#   python AbstractGrader_benchmark.py generate papers.csv --rows 100000
+#   python AbstractGrader_benchmark.py run --rows 10000 100000 --clicks 300 --json results.json
+# Timings are wall-clock, peak resident memory is always reported and --trace-memory adds tracemalloc peaks.
+
+# Operations of the main window that are timed on every call
+timed_operations = ["handle_commit", "submit_score", "load_next_row", "update_progress_bar", "prefetch_next_rows"]
+selection = ("Title", "Abstract", "Decision")
+
+def generate(file_path, rows, abstract_words=200, duplicates=0.0, seed=0, chunksize=10000):
+    # Synthetic CSV with Title, Abstract, Year and DOI columns. Word frequencies follow Zipf's law like
+    # in real text, abstract lengths are log-normal around abstract_words. A share of `duplicates` rows
+    # repeat another paper with the title in capitals, to exercise the near-duplicate detection.
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    letters = np.array(list(string.ascii_lowercase))
+    vocabulary = np.array(["".join(rng.choice(letters, length)) for length in rng.integers(2, 11, 20000)], dtype=object)
+    frequencies = 1 / np.arange(1, len(vocabulary) + 1)
+    frequencies /= frequencies.sum()
+
+    def texts(count, mean_words):
+        lengths = np.clip(rng.lognormal(np.log(mean_words), 0.4, count), 3, mean_words * 5).astype(int)
+        words = vocabulary[rng.choice(len(vocabulary), lengths.sum(), p=frequencies)]
+        return [" ".join(text) for text in np.split(words, np.cumsum(lengths)[:-1])]
+
+    for start in range(0, rows, chunksize):
+        count = min(chunksize, rows - start)
+        chunk = pd.DataFrame({
+            "Title": [title.capitalize() for title in texts(count, 10)],
+            "Abstract": texts(count, abstract_words),
+            "Year": rng.integers(1990, 2026, count),
+            "DOI": [f"10.5555/synthetic.{row}" for row in range(start, start + count)],
+        })
+        copies = np.flatnonzero(rng.random(count) < duplicates)
+        originals = rng.integers(0, count, len(copies))
+        chunk.loc[copies, "Title"] = chunk["Title"].iloc[originals].str.upper().to_numpy()
+        chunk.loc[copies, "Abstract"] = chunk["Abstract"].iloc[originals].to_numpy()
+        chunk.to_csv(file_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+def _timed(method, timings):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = method(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+        return result
+    return wrapper
+
+def _percentiles(timings):
+    import numpy as np
+    if not timings:
+        return None
+    milliseconds = np.array(timings) * 1000
+    return {"calls": len(timings), "p50": float(np.percentile(milliseconds, 50)),
+            "p90": float(np.percentile(milliseconds, 90)), "p99": float(np.percentile(milliseconds, 99)),
+            "max": float(milliseconds.max())}
+
+def _start_tracing(enabled):
+    if enabled:
+        tracemalloc.start()
+
+def _stop_tracing(enabled):
+    # Peak traced Python memory in MB since _start_tracing, None if tracing is off
+    if not enabled:
+        return None
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 ** 2
+
+def benchmark_file(app, source_path, clicks, ranking=False, deduplicate=False, trace_memory=False, seed=0):
+    # trace_memory measures the peak memory of loading and saving with tracemalloc, which makes both slower
+    import numpy as np
+    from PySide6.QtCore import QThreadPool
+    from PySide6.QtWidgets import QFileDialog
+    import AbstractGrader_main
+
+    pool = QThreadPool.globalInstance()
+    rng = np.random.default_rng(seed)
+    timings = {name: [] for name in timed_operations}
+    with tempfile.TemporaryDirectory() as directory:
+        # Work on a copy, so neither the data file nor the user's settings.ini get a journal or session entry
+        file_path = os.path.join(directory, os.path.basename(source_path))
+        shutil.copy(source_path, file_path)
+        AbstractGrader_main.config_path = os.path.join(directory, "settings.ini")
+
+        window = AbstractGrader_main.MainWindow()
+        window.update_button_texts(["Include", "Exclude"])
+        window.queue_seed = str(seed)
+        window.ranking_enabled = ranking
+        window.deduplicate = deduplicate
+        for name in timed_operations:
+            setattr(window, name, _timed(getattr(window, name), timings[name]))
+        window.prefetch_timer.timeout.disconnect()
+        window.prefetch_timer.timeout.connect(window.prefetch_next_rows)
+
+        # load_csv without the file dialog: read the file on this thread, then start grading
+        _start_tracing(trace_memory)
+        start = time.perf_counter()
+        session = AbstractGrader_main.load_session(file_path)
+        window.on_csv_loaded(session, selection)
+        load_time = time.perf_counter() - start
+        load_peak = _stop_tracing(trace_memory)
+        # Wait for the ranking and near-duplicates, so the clicks measure the steady state
+        start = time.perf_counter()
+        pool.waitForDone()
+        app.processEvents()
+        background_time = time.perf_counter() - start
+
+        # Grade like a reviewer who includes about one paper in five
+        window.handle_commit()
+        start = time.perf_counter()
+        for click in range(clicks):
+            window.buttons[0 if rng.random() < 0.2 else 1].setChecked(True)
+            window.handle_commit()
+            app.processEvents()  # Runs the prefetch, as the event loop would between two clicks
+        session_time = time.perf_counter() - start
+        pool.waitForDone()
+        app.processEvents()
+
+        # save_csv without the file dialog, the write runs on the worker thread as usual
+        save_path = os.path.join(directory, "saved" + os.path.splitext(file_path)[1])
+        QFileDialog.getSaveFileName = lambda *args: (save_path, "")
+        _start_tracing(trace_memory)
+        start = time.perf_counter()
+        window.save_csv()
+        pool.waitForDone()
+        app.processEvents()
+        save_time = time.perf_counter() - start
+        save_peak = _stop_tracing(trace_memory)
+
+        graded = window.session.stats.graded
+        window.close()
+        window.session.close()  # Releases the journal before the directory is removed
+        window.deleteLater()
+
+    return {
+        "file": source_path,
+        "rows": len(session.data),
+        "load_seconds": load_time,
+        "load_peak_mb": load_peak,
+        "background_seconds": background_time,
+        "save_seconds": save_time,
+        "save_peak_mb": save_peak,
+        "clicks": clicks,
+        "graded": graded,
+        "rows_per_minute": clicks / session_time * 60 if session_time else None,
+        "operations": {name: _percentiles(values) for name, values in timings.items()},
+        "peak_rss_mb": _peak_rss(),
+    }
+
+def print_result(result):
+    print(f"{result['rows']} rows ({result['file']})")
+    print(f"  load {result['load_seconds']:.2f} s, background tasks {result['background_seconds']:.2f} s, "
+          f"save {result['save_seconds']:.2f} s")
+    if result["load_peak_mb"] is not None:
+        print(f"  peak traced memory: load {result['load_peak_mb']:.1f} MB, save {result['save_peak_mb']:.1f} MB")
+    print(f"  {result['clicks']} scores at {result['rows_per_minute']:.0f} rows per minute of machine time")
+    print(f"  {'operation':<22}{'calls':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in result["operations"].items():
+        if stats is not None:
+            print(f"  {name:<22}{stats['calls']:>7}{stats['p50']:>10.3f}{stats['p90']:>10.3f}"
+                  f"{stats['p99']:>10.3f}{stats['max']:>10.3f}")
+    if result["peak_rss_mb"] is not None:
+        print(f"  peak resident memory so far {result['peak_rss_mb']:.0f} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of Abstract Grader on synthetic data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("generate", help="write a synthetic CSV file")
+    command.add_argument("file")
+    command.add_argument("--rows", type=int, default=100000)
+    command.add_argument("--abstract-words", type=int, default=200, help="typical abstract length in words")
+    command.add_argument("--duplicates", type=float, default=0.0, help="share of rows that repeat another paper")
+    command.add_argument("--seed", type=int, default=0)
+
+    command = commands.add_parser("run", help="time loading, grading and saving")
+    command.add_argument("files", nargs="*", help="data files to use, synthetic files are generated without them")
+    command.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="sizes of the synthetic files")
+    command.add_argument("--abstract-words", type=int, default=200)
+    command.add_argument("--clicks", type=int, default=300, help="number of scores to submit per file")
+    command.add_argument("--ranking", action="store_true", help="serve relevant rows first")
+    command.add_argument("--deduplicate", action="store_true", help="group near-duplicates")
+    command.add_argument("--trace-memory", action="store_true",
+                         help="measure the peak memory of loading and saving with tracemalloc (slows both down)")
+    command.add_argument("--json", help="also write the results to this file, to compare runs")
+    command.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate(args.file, args.rows, args.abstract_words, args.duplicates, args.seed)
+        return
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication, QMessageBox
+    app = QApplication.instance() or QApplication([])
+    # Nobody is there to close message boxes
+    QMessageBox.information = QMessageBox.warning = QMessageBox.critical = lambda *args: QMessageBox.Ok
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        files = args.files
+        if not files:
+            files = []
+            for rows in args.rows:
+                file_path = os.path.join(directory, f"synthetic_{rows}.csv")
+                generate(file_path, rows, args.abstract_words, 0.02 if args.deduplicate else 0.0, args.seed)
+                files.append(file_path)
+        for file_path in files:
+            result = benchmark_file(app, file_path, args.clicks, args.ranking, args.deduplicate, args.trace_memory,
+                                    args.seed)
+            print_result(result)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+import csv
+import os
+import re
+import tempfile
+
+from AbstractGrader_tasks import TaskCancelled, _no_progress, _never_cancelled
+
+# Reference manager and database exports that are converted to a CSV working file on import.
+# Streams with the csv module and no pandas, so the main window can import this at startup.
+# PubMed saves its own format (MEDLINE/NBIB) as .txt or .nbib.
+BIBLIOGRAPHY_FORMATS = {".ris": "ris", ".bib": "bibtex", ".nbib": "nbib", ".txt": "nbib"}
+# Columns of the converted file, the same for every format
+COLUMNS = ["Title", "Abstract", "Authors", "Year", "Journal", "DOI", "Keywords", "Type", "ID"]
+# Fields with several values (authors, keywords) are joined with this
+value_separator = "; "
+
+def is_bibliography(file_path):
+    return os.path.splitext(file_path)[1].lower() in BIBLIOGRAPHY_FORMATS
+
+def converted_path(file_path):
+    # The CSV working file next to the export, it gets the labels and the journal
+    return file_path + ".csv"
+
+def is_outdated(file_path, csv_path=None):
+    # Whether the export changed after its working file was written, e.g. because the search was run again
+    csv_path = csv_path or converted_path(file_path)
+    return os.path.exists(csv_path) and os.path.getmtime(file_path) > os.path.getmtime(csv_path)
+
+def set_aside(csv_path):
+    # Rename a working file together with its journal and store, so the export can be converted again
+    # without losing the labels given so far. Returns the new path of the working file.
+    base = csv_path[:-len(".csv")] if csv_path.endswith(".csv") else csv_path
+    old_path = f"{base}.old.csv"
+    number = 1
+    while os.path.exists(old_path):
+        number += 1
+        old_path = f"{base}.old{number}.csv"
+    for suffix in ("", ".journal", ".sqlite", ".sqlite-wal", ".sqlite-shm"):
+        if os.path.exists(csv_path + suffix):
+            os.replace(csv_path + suffix, old_path + suffix)
+    return old_path
+
+def _year(text):
+    match = re.search(r"\d{4}", text or "")
+    return match.group(0) if match else ""
+
+def _record(fields):
+    # Field name -> list of values to one row of the converted file
+    def first(*names):
+        for name in names:
+            if fields.get(name):
+                return fields[name][0]
+        return ""
+
+    def joined(*names):
+        for name in names:
+            if fields.get(name):
+                return value_separator.join(fields[name])
+        return ""
+
+    return {
+        "Title": first("title"),
+        "Abstract": joined("abstract"),
+        "Authors": joined("authors"),
+        "Year": _year(first("year")),
+        "Journal": first("journal"),
+        "DOI": first("doi"),
+        "Keywords": joined("keywords"),
+        "Type": first("type"),
+        "ID": first("id"),
+    }
+
+# RIS tag -> field, the first tag of a field that is present wins
+ris_fields = {
+    "TY": "type", "TI": "title", "T1": "title", "CT": "title", "AB": "abstract", "N2": "abstract",
+    "AU": "authors", "A1": "authors", "PY": "year", "Y1": "year", "DA": "year",
+    "JO": "journal", "JF": "journal", "T2": "journal", "JA": "journal", "J2": "journal",
+    "DO": "doi", "KW": "keywords", "AN": "id", "ID": "id",
+}
+ris_line = re.compile(r"^([A-Z][A-Z0-9])  -(?: (.*))?$")
+
+def parse_ris(lines):
+    # Yields one record per TY ... ER block. Lines without a tag continue the previous value.
+    fields = None
+    sources = None  # Field -> the tag it was taken from
+    previous = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        match = ris_line.match(line)
+        if match is None:
+            if fields is not None and previous is not None and line.strip():
+                previous[-1] = f"{previous[-1]} {line.strip()}"
+            continue
+        tag, value = match.group(1), (match.group(2) or "").strip()
+        if tag == "TY":
+            fields, sources = {}, {}
+        if fields is None:
+            continue
+        if tag == "ER":
+            yield _record(fields)
+            fields = previous = None
+            continue
+        previous = None
+        name = ris_fields.get(tag)
+        if name is not None and value:
+            # Some programs write a field under two tags (e.g. AB and N2), only the first one is used
+            if sources.setdefault(name, tag) != tag:
+                continue
+            fields.setdefault(name, []).append(value)
+            previous = fields[name]
+    if fields:
+        # Missing ER at the end of the file
+        yield _record(fields)
+
+nbib_fields = {
+    "PT": "type", "TI": "title", "AB": "abstract", "FAU": "authors", "AU": "short authors", "DP": "year",
+    "JT": "journal", "TA": "short journal", "LID": "doi", "AID": "doi", "MH": "keywords", "OT": "keywords",
+    "PMID": "id",
+}
+nbib_line = re.compile(r"^([A-Z][A-Z0-9]{0,3}) *- (.*)$")
+
+def parse_nbib(lines):
+    # PubMed (MEDLINE) format: records start with PMID- and are separated by blank lines,
+    # continuation lines are indented
+    fields = None
+    previous = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith("      ") and previous is not None:
+            previous[-1] = f"{previous[-1]} {line.strip()}"
+            continue
+        match = nbib_line.match(line)
+        if match is None:
+            if not line.strip() and fields:
+                yield _nbib_record(fields)
+                fields = None
+            previous = None
+            continue
+        tag, value = match.group(1), match.group(2).strip()
+        if tag == "PMID" and fields:
+            yield _nbib_record(fields)
+            fields = None
+        if fields is None:
+            fields = {}
+        previous = None
+        name = nbib_fields.get(tag)
+        if name == "doi":
+            # LID/AID carry several identifiers, e.g. "10.1000/xyz [doi]" and "S0140-6736(20)30183-5 [pii]"
+            if not value.endswith("[doi]"):
+                continue
+            value = value[:-len("[doi]")].strip()
+        if name is not None and value:
+            fields.setdefault(name, []).append(value)
+            previous = fields[name]
+    if fields:
+        yield _nbib_record(fields)
+
+def _nbib_record(fields):
+    # Full author and journal names if the record has them, the abbreviations otherwise
+    for name in ("authors", "journal"):
+        if not fields.get(name) and fields.get("short " + name):
+            fields[name] = fields["short " + name]
+    return _record(fields)
+
+bibtex_fields = {
+    "title": "title", "abstract": "abstract", "author": "authors", "year": "year", "date": "year",
+    "journal": "journal", "journaltitle": "journal", "booktitle": "journal", "doi": "doi",
+    "keywords": "keywords",
+}
+bibtex_start = re.compile(r"@\s*(\w+)\s*[{(]\s*([^,\s]*)\s*,?")
+bibtex_field = re.compile(r"\s*,?\s*([\w\-:.]+)\s*=\s*")
+bibtex_delimiter = re.compile(r"\\.|[{}()]")
+bibtex_word = re.compile(r"[^,#})\s]+")
+bibtex_concatenation = re.compile(r"\s*#\s*")
+bibtex_closers = {"{": "}", "(": ")"}
+latex_replacements = [(r"\&", "&"), (r"\%", "%"), (r"\_", "_"), (r"\$", "$"), ("~", " ")]
+
+def _bibtex_entries(lines):
+    # Text of one @entry{...} at a time: lines are collected until the entry's braces (or parentheses)
+    # are balanced again, so only a single entry is held in memory
+    buffer = []
+    opener = None
+    depth = 0
+    for line in lines:
+        while line:
+            if not buffer:
+                position = line.find("@")
+                if position < 0:
+                    break
+                line = line[position:]
+            end = None
+            for match in bibtex_delimiter.finditer(line):
+                character = match.group(0)
+                if opener is None:
+                    if character in bibtex_closers:
+                        opener, depth = character, 1
+                elif character == opener:
+                    depth += 1
+                elif character == bibtex_closers[opener]:
+                    depth -= 1
+                    if depth == 0:
+                        end = match.end()
+                        break
+            if end is None:
+                buffer.append(line)
+                break
+            # Another entry may start on the same line
+            buffer.append(line[:end])
+            yield "".join(buffer)
+            buffer, opener = [], None
+            line = line[end:]
+    if buffer:
+        yield "".join(buffer)
+
+def _bibtex_value(text, position, strings):
+    # Parses a value ({...}, "..." or a bare word, joined with #) starting at position,
+    # returns the value and the position after it
+    parts = []
+    while position < len(text):
+        character = text[position]
+        if character == "{" or character == '"':
+            close = "}" if character == "{" else '"'
+            depth = 0
+            end = position + 1
+            while end < len(text):
+                if text[end] == "\\":
+                    end += 2
+                    continue
+                if text[end] == "{":
+                    depth += 1
+                elif text[end] == "}" and (depth > 0 or close != "}"):
+                    depth -= 1
+                elif text[end] == close and depth == 0:
+                    break
+                end += 1
+            parts.append(text[position + 1:end])
+            position = end + 1
+        else:
+            match = bibtex_word.match(text, position)
+            if match is None:
+                break
+            parts.append(strings.get(match.group(0).lower(), match.group(0)))
+            position = match.end()
+        match = bibtex_concatenation.match(text, position)
+        if match is None:
+            break
+        position = match.end()
+    return "".join(parts), position
+
+def _clean_latex(value):
+    value = value.replace("{", "").replace("}", "")
+    for latex, text in latex_replacements:
+        value = value.replace(latex, text)
+    return " ".join(value.split())
+
+def parse_bibtex(lines):
+    # Yields one record per entry, @string macros are substituted, @comment and @preamble skipped
+    strings = {}
+    for entry in _bibtex_entries(lines):
+        match = bibtex_start.match(entry)
+        if match is None:
+            continue
+        entry_type, key = match.group(1).lower(), match.group(2)
+        if entry_type in ("comment", "preamble"):
+            continue
+        # @string{name = value} has no key, its only field starts right away
+        position = match.start(2) if entry_type == "string" else match.end()
+        fields = {"type": [entry_type], "id": [key]}
+        while True:
+            field = bibtex_field.match(entry, position)
+            if field is None:
+                break
+            value, position = _bibtex_value(entry, field.end(), strings)
+            name = field.group(1).lower()
+            if entry_type == "string":
+                strings[name] = value
+                continue
+            value = _clean_latex(value)
+            if name not in bibtex_fields or not value:
+                continue
+            if name == "author":
+                fields["authors"] = [author.strip() for author in value.split(" and ") if author.strip()]
+            elif name == "keywords":
+                fields["keywords"] = [keyword.strip() for keyword in re.split(r"[,;]", value) if keyword.strip()]
+            else:
+                fields.setdefault(bibtex_fields[name], []).append(value)
+        if entry_type != "string":
+            yield _record(fields)
+
+parsers = {"ris": parse_ris, "bibtex": parse_bibtex, "nbib": parse_nbib}
+
+def _is_pubmed(file_path):
+    # .txt files are only PubMed exports if their first record starts with PMID-
+    with open(file_path, "rb") as source:
+        for line in source:
+            line = line.decode("utf-8-sig", errors="replace").strip()
+            if line:
+                return line.startswith("PMID-")
+    return False
+
+def read_records(file_path, report_progress=_no_progress, is_cancelled=_never_cancelled, check_every=1000):
+    # Streams the records of an export, reading it line by line. Progress is reported in bytes.
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".txt" and not _is_pubmed(file_path):
+        raise ValueError(f"{os.path.basename(file_path)} is not a PubMed export, it does not start with a PMID- line.")
+    parser = parsers[BIBLIOGRAPHY_FORMATS[extension]]
+    total = os.path.getsize(file_path)
+
+    with open(file_path, "rb") as source:
+        def lines():
+            for number, line in enumerate(source):
+                if number % check_every == 0:
+                    if is_cancelled():
+                        raise TaskCancelled()
+                    report_progress(min(source.tell(), total), total)
+                # Exports are UTF-8, sometimes with a byte order mark
+                yield line.decode("utf-8-sig" if number == 0 else "utf-8", errors="replace")
+
+        yield from parser(lines())
+    report_progress(total, total)
+
+def convert_bibliography(file_path, csv_path=None, report_progress=_no_progress, is_cancelled=_never_cancelled):
+    # Write the records of a RIS/BibTeX/NBIB export into a CSV file as they are parsed, so memory use does
+    # not depend on the size of the export. Written to a temporary file first like every save.
+    # Returns the path of the CSV file and the number of records.
+    from AbstractGrader_io import copy_permissions
+    csv_path = csv_path or converted_path(file_path)
+    directory = os.path.dirname(os.path.abspath(csv_path))
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    count = 0
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8", newline="") as temp_file:
+            writer = csv.DictWriter(temp_file, fieldnames=COLUMNS)
+            writer.writeheader()
+            for record in read_records(file_path, report_progress, is_cancelled):
+                writer.writerow(record)
+                count += 1
+            if not count:
+                raise ValueError(f"No records found in {os.path.basename(file_path)}.")
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        copy_permissions(temp_path, csv_path)
+        os.replace(temp_path, csv_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return csv_path, count
@@ -0,0 +1,135 @@
+import argparse
+import sys
+
+# Batch operations on the same files and journals as the GUI, without opening a window.
+# pandas and the grading core are only imported once a command runs, so --help is instant.
+
+def open_session(args):
+    from AbstractGrader_core import GradingSession
+    from AbstractGrader_labels import CodingScheme
+    # Journalled labels that were never saved are replayed on load, like in the GUI
+    session = GradingSession.load(args.file, store=args.sqlite)
+    session.start(None, None, args.column, reviewers=args.reviewers, reviewer=args.reviewer, overlap=args.overlap,
+                  scheme=CodingScheme(multi_label=args.multi_label))
+    return session
+
+def progress(args):
+    session = open_session(args)
+    stats = session.stats
+    print(f"{stats.graded}/{stats.total} rows completed, {stats.remaining} left")
+    for line in stats.breakdown():
+        print(f"  {line}")
+    if session.restored:
+        source = "store" if session.store is not None else "journal"
+        print(f"({session.restored} labels restored from the {source}, not saved into the file yet)")
+    session.close()
+
+def apply_labels(args):
+    # Copy labels from another file, matched by a key column (e.g. a DOI) or else by row position
+    from AbstractGrader_io import read_data_file
+    session = open_session(args)
+    source = read_data_file(args.source)
+    source_column = args.source_column or args.column
+    if source_column not in source.columns:
+        raise SystemExit(f"{args.source} has no column {source_column}")
+
+    if args.key:
+        if args.key not in source.columns or args.key not in session.data.columns:
+            raise SystemExit(f"Both files need the key column {args.key}")
+        labels = source.dropna(subset=[source_column]).drop_duplicates(subset=[args.key], keep="last")
+        labels = labels.set_index(args.key)[source_column]
+        matched = session.data[args.key].map(labels)
+    else:
+        if len(source) != len(session.data):
+            raise SystemExit(f"{args.source} has {len(source)} rows, expected {len(session.data)}. Use --key.")
+        matched = source[source_column].set_axis(session.data.index)
+    matched = matched[matched.notna() & session.data.index.isin(session.rows)]
+    if not args.overwrite:
+        matched = matched[~matched.index.isin(session.graded_rows())]
+
+    # Saved right away, so the labels do not need to go through the journal of FILE
+    count = session.label_many(matched.index, matched.to_numpy(), journal=False)
+    output = args.output or args.file
+    session.save(output)
+    session.close()
+    print(f"{count} labels applied, written to {output}")
+
+def export(args):
+    # Write a subset of the rows, e.g. all included papers for full-text screening
+    from AbstractGrader_io import write_data_file
+    session = open_session(args)
+    graded = session.data.index.isin(session.graded_rows())
+    if args.label:
+        # A parent category also selects its subcategories
+        selected = session.label_mask(args.label).to_numpy()
+    elif args.ungraded:
+        selected = ~graded
+    else:
+        selected = graded
+    selected = selected & session.data.index.isin(session.rows)
+    write_data_file(session.decoded()[selected], args.output)
+    session.close()
+    print(f"{selected.sum()} rows written to {args.output}")
+
+def import_bibliography(args):
+    # Convert a RIS/BibTeX/NBIB export to CSV, as the GUI does when one is opened
+    from AbstractGrader_bibliography import BIBLIOGRAPHY_FORMATS, convert_bibliography, is_bibliography
+    if not is_bibliography(args.file):
+        raise SystemExit(f"{args.file} is not a {', '.join(BIBLIOGRAPHY_FORMATS)} file")
+    try:
+        output, count = convert_bibliography(args.file, args.output)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"{count} records written to {output}")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["merge"]:
+        # Has its own argument parser
+        from AbstractGrader_annotators import main as merge_main
+        return merge_main(argv[1:])
+
+    parser = argparse.ArgumentParser(description="Abstract Grader without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    session_options = argparse.ArgumentParser(add_help=False)
+    session_options.add_argument("file", help="data file (.csv, .feather or .parquet), its journal is replayed")
+    session_options.add_argument("--column", required=True, help="output column with the labels")
+    session_options.add_argument("--reviewers", type=int, default=1, help="number of reviewers the rows are split between")
+    session_options.add_argument("--reviewer", type=int, default=1, help="only count this reviewer's share (1-based)")
+    session_options.add_argument("--overlap", type=float, default=0.0, help="share of rows graded by all reviewers")
+    session_options.add_argument("--multi-label", action="store_true",
+                                 help="papers can have several labels, separated by ';' in the output column")
+    session_options.add_argument("--sqlite", action="store_true",
+                                 help="use the SQLite store of FILE (FILE.sqlite) instead of its journal")
+
+    command = commands.add_parser("progress", parents=[session_options], help="show how many rows are graded")
+    command.set_defaults(handler=progress)
+
+    command = commands.add_parser("apply-labels", parents=[session_options], help="copy labels from another file")
+    command.add_argument("source", help="file to take the labels from")
+    command.add_argument("--source-column", help="label column in the source file, defaults to --column")
+    command.add_argument("--key", help="column to match rows on, rows are matched by position without it")
+    command.add_argument("--overwrite", action="store_true", help="also replace labels that were already given")
+    command.add_argument("--output", help="file to write the result to, defaults to overwriting FILE")
+    command.set_defaults(handler=apply_labels)
+
+    command = commands.add_parser("export", parents=[session_options], help="write a subset of the rows")
+    command.add_argument("--output", required=True, help="file to write the rows to")
+    subset = command.add_mutually_exclusive_group()
+    subset.add_argument("--label", action="append", help="only rows with this label, can be repeated")
+    subset.add_argument("--ungraded", action="store_true", help="only rows without a label")
+    command.set_defaults(handler=export)
+
+    command = commands.add_parser("import", help="convert a RIS, BibTeX or PubMed export to CSV")
+    command.add_argument("file", help="export to convert (.ris, .bib, .nbib or PubMed .txt)")
+    command.add_argument("--output", help="CSV file to write, defaults to FILE.csv")
+    command.set_defaults(handler=import_bibliography)
+
+    commands.add_parser("merge", help="merge reviewer files and report their agreement, see merge --help")
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from AbstractGrader_io import read_header, read_data_file, write_data_file
+from AbstractGrader_tasks import _no_progress, _never_cancelled
+from AbstractGrader_queue import PendingRows
+from AbstractGrader_stats import GradingStats
+from AbstractGrader_journal import GradingJournal
+from AbstractGrader_annotators import shard_mask
+from AbstractGrader_labels import CodingScheme
+from AbstractGrader_search import parse_query, matching_rows
+
+class GradingSession:
+    # One dataset being graded: the data with its output column, the queue of ungraded rows, the counters
+    # and the journal. Imports no Qt, the main window is a view over it and the CLI uses it directly.
+    def __init__(self, data, file_path, projected=False, store=None):
+        self.data = data
+        self.file_path = file_path
+        self.projected = projected  # Whether data only holds the selected columns of the source file
+        # Optional SQLite store (AbstractGrader_store) the data was loaded from, it also replaces the journal
+        self.store = store
+        # Restore labels from a previous session that were never saved into the file
+        self.journal = store if store is not None else GradingJournal(GradingJournal.path_for(file_path))
+        self.restored = self.journal.replay(data)
+        # End of the records of earlier sessions, discarding this session keeps them
+        self.loaded_mark = self.journal.mark()
+        self.unsaved_changes = self.restored > 0
+        self.change_count = 0  # Number of labels given, used to tell if a finished save is still up to date
+        self.title_col = None
+        self.abstract_col = None
+        self.output_col = None
+        self.scheme = None  # Categories and storage of the output column, set in start()
+        self.rows = None  # Rows graded in this session: all of them, or this reviewer's share
+        self.pending_rows = None  # Queue of ungraded row indices, built in start()
+        self.stats = None  # Graded/total and per-label counts of the output column
+        self.duplicates = {}  # Shown row -> its near-duplicates, which get the same label
+        self.ranker = None  # Optional relevance ranking that decides the next row
+        self.graded_at = None  # Time every row was labelled, as far as the journal knows (NaN otherwise)
+        self.search_index = None  # Optional inverted index of title and abstract for find()
+
+    @classmethod
+    def load(cls, file_path, columns=None, string_dtype=False, report_progress=_no_progress,
+             is_cancelled=_never_cancelled, store=False, wal=True):
+        # Read a CSV/Feather/Parquet file. With columns (title, abstract, output) only those are loaded,
+        # the other columns are streamed through from the source file on save.
+        # With store, the file is imported into its SQLite store once and loaded from there.
+        if store:
+            return cls.load_store(file_path, columns, string_dtype, report_progress, is_cancelled, wal)
+        usecols = dtype = None
+        if columns is not None:
+            header = read_header(file_path)
+            usecols = [column for column in dict.fromkeys(columns) if column in header]
+            if string_dtype:
+                dtype = {column: "string" for column in columns[:2]}
+        data = read_data_file(file_path, report_progress, is_cancelled, usecols=usecols, dtype=dtype)
+        return cls(data, file_path, projected=columns is not None)
+
+    @classmethod
+    def load_store(cls, file_path, columns=None, string_dtype=False, report_progress=_no_progress,
+                   is_cancelled=_never_cancelled, wal=True):
+        from AbstractGrader_store import DatasetStore
+        store = DatasetStore.open(file_path, wal, report_progress, is_cancelled)
+        try:
+            dtype = None
+            if columns is not None and string_dtype:
+                dtype = {column: "string" for column in columns[:2]}
+            data = store.read_data(columns, dtype, report_progress, is_cancelled)
+            return cls(data, file_path, projected=columns is not None, store=store)
+        except BaseException:
+            store.close()
+            raise
+
+    @staticmethod
+    def available_columns(file_path, store=False):
+        # Columns of the file plus output columns that so far only exist in its journal (or store)
+        header = read_header(file_path)
+        if store:
+            from AbstractGrader_store import DatasetStore
+            if not os.path.exists(DatasetStore.path_for(file_path)):
+                return header
+            journal = DatasetStore(DatasetStore.path_for(file_path), file_path)
+        else:
+            journal = GradingJournal(GradingJournal.path_for(file_path))
+        columns = header + [column for column in journal.columns() if column not in header]
+        journal.close()
+        return columns
+
+    def start(self, title_col, abstract_col, output_col, seed=None, reviewers=1, reviewer=1, overlap=0.0, scheme=None):
+        self.title_col = title_col
+        self.abstract_col = abstract_col
+        self.output_col = output_col
+        self.scheme = scheme if scheme is not None else CodingScheme()
+
+        if output_col not in self.data.columns:
+            # Add new column to the DataFrame
+            self.data[output_col] = None  # Initialize new column with empty values
+        # Text labels to a Categorical or bitmask column, labels found in the file are added to the scheme
+        self.data[output_col] = self.scheme.encode(self.data[output_col])
+
+        # With several reviewers, only grade this reviewer's share of the rows
+        output = self.data[output_col]
+        if reviewers > 1:
+            output = output[shard_mask(self.data.index, reviewers, reviewer, overlap)]
+        self.rows = output.index
+
+        # Build the queue of ungraded rows once, it is kept up to date by label()
+        self.pending_rows = PendingRows(output.index[~self.scheme.graded(output)], seed=seed,
+                                        all_indices=output.index)
+        self.stats = GradingStats.from_column(output, self.scheme)
+        # Labels saved into the file carry no time, only those still in the journal do
+        self.graded_at = pd.Series(np.nan, index=self.data.index)
+        label_times = self.journal.label_times(output_col)
+        known = [row for row in label_times if row in self.graded_at.index]
+        self.graded_at.loc[known] = [label_times[row] for row in known]
+        self.search_index = None
+        self.duplicates = {}
+        self.ranker = None
+
+    def next_row(self):
+        # Highest ranked pending row once the ranking has relevant and irrelevant labels to learn from,
+        # otherwise the next random one. None once all are graded.
+        self.refresh()
+        if self.ranker is not None and self.ranker.ready():
+            row = self.ranker.peek(self.pending_rows)
+            if row is not None:
+                return row
+        return self.pending_rows.peek()
+
+    def candidates(self, count):
+        # The rows that will most likely be served next
+        if self.ranker is not None and self.ranker.ready():
+            return self.ranker.candidates(count, self.pending_rows)
+        return self.pending_rows.candidates(count)
+
+    def text(self, row):
+        return self.data.at[row, self.title_col], self.data.at[row, self.abstract_col]
+
+    def get_label(self, row):
+        # The label, a tuple of labels if several are allowed, or None if the row is ungraded
+        return self.scheme.value(self.data.at[row, self.output_col])
+
+    def graded_rows(self):
+        return self.data.index[self.scheme.graded(self.data[self.output_col])]
+
+    def label_mask(self, labels):
+        # Rows with any of the labels (or their subcategories), vectorised over the whole column
+        return self.scheme.has_any(self.data[self.output_col], labels)
+
+    def several_labels(self):
+        # Number of rows with more than one label, they have no single-label form
+        if self.scheme is None or not self.scheme.multi_label:
+            return 0
+        masks = self.data[self.output_col].to_numpy()
+        return int(((masks & (masks - 1)) != 0).sum())
+
+    def set_scheme(self, scheme):
+        # Switch to changed categories or between one and several labels per paper
+        several = self.several_labels()
+        if several and not scheme.multi_label:
+            raise ValueError(f"Papers with several labels: {several}, give them one label each first.")
+        output = self.scheme.decode(self.data[self.output_col])
+        self.scheme = scheme
+        self.data[self.output_col] = scheme.encode(output)
+        self.stats = GradingStats.from_column(self.data.loc[self.rows, self.output_col], scheme)
+
+    def label(self, row, label):
+        # Write a label (a tuple of labels if several are allowed) for a row and its near-duplicates,
+        # returns the rows that were changed
+        label = self.scheme.normalize(label)
+        # Near-duplicates that were given a different label since (e.g. in the review) keep it
+        shown_label = self.get_label(row)
+        rows = [row] + [duplicate for duplicate in self.duplicates.get(row, [])
+                        if self.get_label(duplicate) in (None, shown_label)]
+        now = time.time()
+        for changed_row in rows:
+            old_label = self.get_label(changed_row)
+            self.scheme.set(self.data, self.output_col, changed_row, label)
+            self.graded_at.at[changed_row] = now
+            self.stats.record(old_label, label)
+            self.pending_rows.remove(changed_row)
+            self.journal.append(changed_row, self.output_col, self.scheme.to_text(label))
+        self.unsaved_changes = True
+        self.change_count += 1
+        return rows
+
+    def refresh(self):
+        # Take over the labels other instances wrote into the same store since the last call,
+        # returns the number of rows changed. An indexed query that usually finds nothing.
+        if self.store is None or self.output_col is None:
+            return 0
+        changed = 0
+        for row, text, label_time in self.store.changes(self.output_col):
+            if row not in self.graded_at.index:
+                continue
+            label = self.scheme.normalize(text)
+            old_label = self.get_label(row)
+            if old_label == label:
+                # Written by this instance
+                continue
+            self.scheme.set(self.data, self.output_col, row, label)
+            self.graded_at.at[row] = label_time
+            if row in self.rows:
+                self.stats.record(old_label, label)
+            self.pending_rows.remove(row)
+            changed += 1
+        if changed:
+            self.unsaved_changes = True
+        return changed
+
+    def label_many(self, rows, labels, journal=True):
+        # Bulk version of label() without near-duplicate propagation for labels in their saved text form,
+        # the column and the counters are rebuilt once. Callers that save right away can skip the journal,
+        # but not a store: it is what other instances and later sessions load the labels from.
+        rows = list(rows)
+        labels = list(labels)
+        if not rows:
+            return 0
+        output = self.scheme.decode(self.data[self.output_col])
+        output.loc[rows] = labels
+        self.data[self.output_col] = self.scheme.encode(output)
+        self.graded_at.loc[rows] = time.time()
+        for row in rows:
+            self.pending_rows.remove(row)
+        if self.store is not None:
+            self.store.append_many(rows, self.output_col, labels)
+        elif journal:
+            for row, label in zip(rows, labels):
+                self.journal.append(row, self.output_col, label)
+            self.journal.sync()
+        self.stats = GradingStats.from_column(self.data.loc[self.rows, self.output_col], self.scheme)
+        self.unsaved_changes = True
+        self.change_count += 1
+        return len(rows)
+
+    def find(self, labels=None, query=None, since=None, ungraded=False):
+        # Graded (or ungraded) rows of this session that have any of the labels, contain all words and
+        # "phrases" of the query and were labelled since the given time. Most recently labelled first.
+        output = self.data[self.output_col]
+        graded = self.scheme.graded(output)
+        mask = (~graded if ungraded else graded) & self.data.index.isin(self.rows)
+        if labels:
+            mask &= self.scheme.has_any(output, labels)
+        if since is not None:
+            mask &= self.graded_at >= since
+        rows = self.data.index[mask.to_numpy()]
+        if query:
+            rows = self.search(query, rows)
+        return self.graded_at[rows].sort_values(ascending=False, kind="stable").index
+
+    def search(self, query, rows):
+        # The rows whose title and abstract contain the query. With an index only its candidates are
+        # checked against the text, without one all given rows are.
+        words, patterns = parse_query(query)
+        if not patterns:
+            return rows
+        if self.search_index is not None and words:
+            candidates = self.data.index[self.search_index.candidates(words)]
+            rows = rows[rows.isin(candidates)]
+        texts = (self.data.loc[rows, self.title_col].fillna("").astype(str) + " "
+                 + self.data.loc[rows, self.abstract_col].fillna("").astype(str))
+        return rows[matching_rows(texts, patterns).to_numpy()]
+
+    def set_duplicates(self, clusters, current_row=None):
+        # clusters: groups of near-duplicate row positions. One ungraded row of each group stays in the queue
+        # (preferably the one currently shown), the other ungraded rows get its label. Rows that are graded
+        # already keep their own label.
+        for positions in clusters:
+            pending = [row for row in self.data.index[positions] if row in self.pending_rows]
+            if len(pending) < 2:
+                continue
+            shown = current_row if current_row in pending else pending[0]
+            for row in pending:
+                if row != shown:
+                    self.pending_rows.remove(row)
+            self.duplicates[shown] = [row for row in pending if row != shown]
+
+    def decoded(self):
+        # The data with the output column as text again, for saving and exporting.
+        # Only the output column changes while labelling, so it is the only one that is copied.
+        data = self.data.copy(deep=False)
+        data[self.output_col] = self.scheme.decode(self.data[self.output_col])
+        return data
+
+    def snapshot(self):
+        # Copy of the state to save, taken before the save starts so labelling can continue meanwhile
+        self.refresh()
+        return self.decoded(), self.change_count, self.journal.mark()
+
+    def write(self, snapshot, save_path, report_progress=_no_progress, is_cancelled=_never_cancelled):
+        # Can run on a worker thread, only reads the snapshot and the source file.
+        # Returns whether the store imported the saved file again, which is passed on to saved().
+        if not self.projected:
+            write_data_file(snapshot, save_path, report_progress, is_cancelled)
+        elif self.store is not None:
+            # Exported from the store, the source file may have been overwritten since it was imported
+            write_data_file(snapshot, save_path, report_progress, is_cancelled, source_store=self.store)
+        else:
+            write_data_file(snapshot, save_path, report_progress, is_cancelled, source_path=self.file_path)
+        if self.store is None or os.path.abspath(save_path) != os.path.abspath(self.file_path):
+            return False
+        if self.store.covers(self.output_col, snapshot[self.output_col]):
+            return False
+        # The file has labels the store would not export, so the store has to take them from the file
+        self.store.import_saved(self.file_path, report_progress)
+        return True
+
+    def saved(self, save_path, change_count, journal_mark, imported=False):
+        # Saving over the source file makes the journal redundant up to the snapshot, so compact it away.
+        # A store that imported the file again in write() is up to date already.
+        if os.path.abspath(save_path) == os.path.abspath(self.file_path) and not imported:
+            self.journal.compact(journal_mark)
+            # Only records of this session are left
+            self.loaded_mark = 0
+        # Labels given while the save was running are not part of the file yet
+        self.unsaved_changes = self.change_count != change_count
+
+    def save(self, save_path, report_progress=_no_progress, is_cancelled=_never_cancelled):
+        data, change_count, journal_mark = self.snapshot()
+        imported = self.write(data, save_path, report_progress, is_cancelled)
+        self.saved(save_path, change_count, journal_mark, imported)
+
+    def discard(self):
+        # Closing without saving: the labels of this session are dropped from the journal so the next load
+        # does not restore them, labels restored from an earlier session stay. A store keeps its labels,
+        # other instances share them.
+        if self.store is None:
+            self.journal.truncate(self.loaded_mark)
+
+    def close(self):
+        self.journal.close()
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from AbstractGrader_tasks import TaskCancelled, _no_progress, _never_cancelled
+
+_mix = np.uint64(0x9E3779B97F4A7C15)  # Odd 64 bit constant to combine hashes
+
+def minhash_signatures(texts, num_perm=32, report_progress=_no_progress, is_cancelled=_never_cancelled, chunksize=20000):
+    # MinHash signature of the word bigrams of every text. Rows with fewer than two words get no signature
+    # (has_signature is False), they cannot be compared meaningfully.
+    texts = texts.fillna("").astype(str).reset_index(drop=True)
+    rng = np.random.default_rng(0)
+    seeds = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+    multipliers = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+    signatures = np.full((len(texts), num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    has_signature = np.zeros(len(texts), dtype=bool)
+
+    for start in range(0, len(texts), chunksize):
+        if is_cancelled():
+            raise TaskCancelled()
+        tokens = texts.iloc[start:start + chunksize].str.lower().str.findall(r"\w+").explode().dropna()
+        report_progress(min(start + chunksize, len(texts)), len(texts))
+        if len(tokens) < 2:
+            continue
+        hashes = pd.util.hash_array(tokens.to_numpy(dtype=object))
+        rows = tokens.index.to_numpy()
+        # Bigrams are pairs of consecutive tokens within the same row, rows stay sorted
+        same_row = rows[1:] == rows[:-1]
+        shingles = (hashes[:-1][same_row] * _mix) ^ hashes[1:][same_row]
+        shingle_rows = rows[:-1][same_row]
+        if len(shingles) == 0:
+            continue
+        starts = np.flatnonzero(np.r_[True, shingle_rows[1:] != shingle_rows[:-1]])
+        signature_rows = shingle_rows[starts]
+        has_signature[signature_rows] = True
+        for permutation in range(num_perm):
+            permuted = (shingles ^ seeds[permutation]) * multipliers[permutation]
+            permuted ^= permuted >> np.uint64(31)
+            signatures[signature_rows, permutation] = np.minimum.reduceat(permuted, starts)
+    return signatures, has_signature
+
+def _find(parents, position):
+    root = position
+    while parents[root] != root:
+        root = parents[root]
+    while parents[position] != root:
+        parents[position], position = root, parents[position]
+    return root
+
+def duplicate_clusters(signatures, has_signature, threshold=0.8, bands=8):
+    # Locality-sensitive hashing: rows whose signatures agree completely on at least one band are candidates,
+    # candidates are kept if their estimated Jaccard similarity reaches the threshold.
+    # Returns a list of arrays of row positions, one per group of near-duplicates.
+    rows_per_band = signatures.shape[1] // bands
+    candidates = np.flatnonzero(has_signature)
+    parents = list(range(len(signatures)))
+    for band in range(bands):
+        band_values = signatures[candidates, band * rows_per_band:(band + 1) * rows_per_band]
+        keys = band_values[:, 0].copy()
+        for column in range(1, rows_per_band):
+            keys = (keys * _mix) ^ band_values[:, column]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        # Link every row of a bucket to the first row of that bucket
+        bucket_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        first_in_bucket = order[np.maximum.accumulate(np.where(bucket_start, np.arange(len(order)), 0))]
+        a = candidates[order[~bucket_start]]
+        b = candidates[first_in_bucket[~bucket_start]]
+        similar = (signatures[a] == signatures[b]).mean(axis=1) >= threshold
+        for row_a, row_b in zip(a[similar], b[similar]):
+            root_a, root_b = _find(parents, row_a), _find(parents, row_b)
+            if root_a != root_b:
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    roots = np.array([_find(parents, position) for position in range(len(parents))], dtype=np.int64)
+    duplicated = np.flatnonzero(roots != np.arange(len(roots)))
+    if len(duplicated) == 0:
+        return []
+    members = np.union1d(duplicated, roots[duplicated])
+    groups = pd.Series(members).groupby(roots[members])
+    return [group.to_numpy() for _, group in groups]
+
+def find_duplicates(titles, abstracts, threshold=0.8, report_progress=_no_progress, is_cancelled=_never_cancelled):
+    # Worker task: groups of near-duplicate rows (by position) based on title and abstract
+    texts = titles.fillna("").astype(str) + " " + abstracts.fillna("").astype(str)
+    signatures, has_signature = minhash_signatures(texts, report_progress=report_progress, is_cancelled=is_cancelled)
+    return duplicate_clusters(signatures, has_signature, threshold)
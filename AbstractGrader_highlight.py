@@ -0,0 +1,53 @@
+import html
+import re
+
+# Background colours for matches of inclusion and exclusion terms
+include_colour = "#b6f2b6"
+exclude_colour = "#f7b6b6"
+
+def parse_terms(text):
+    # One term per line, empty lines are ignored
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+def _term_pattern(term):
+    # Terms starting with "re:" are regular expressions, all others are matched literally as whole words
+    if term.startswith("re:"):
+        return f"(?:{term[3:]})"
+    pattern = re.escape(term)
+    if re.match(r"\w", term):
+        pattern = r"\b" + pattern
+    if re.search(r"\w$", term):
+        pattern = pattern + r"\b"
+    return pattern
+
+class Highlighter:
+    # All terms are compiled into a single case-insensitive regex once, so every abstract is scanned
+    # in one pass no matter how many terms there are
+    def __init__(self, include_terms, exclude_terms):
+        groups = []
+        for name, terms in (("include", include_terms), ("exclude", exclude_terms)):
+            if terms:
+                # Longest terms first, so a longer term wins over a shorter one at the same position
+                alternatives = "|".join(_term_pattern(term) for term in sorted(terms, key=len, reverse=True))
+                groups.append(f"(?P<{name}>{alternatives})")
+        # Raises re.error for invalid regular expressions
+        self.pattern = re.compile("|".join(groups), re.IGNORECASE) if groups else None
+
+    def __bool__(self):
+        return self.pattern is not None
+
+    def __call__(self, text):
+        # HTML-escaped text with the matches wrapped in coloured spans
+        if self.pattern is None:
+            return html.escape(text)
+        parts = []
+        position = 0
+        for match in self.pattern.finditer(text):
+            if match.end() == match.start():
+                continue  # Skip empty matches of regular expression terms
+            colour = include_colour if match.lastgroup == "include" else exclude_colour
+            parts.append(html.escape(text[position:match.start()]))
+            parts.append(f'<span style="background-color: {colour};">{html.escape(match.group())}</span>')
+            position = match.end()
+        parts.append(html.escape(text[position:]))
+        return "".join(parts)
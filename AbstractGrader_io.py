@@ -0,0 +1,197 @@
+import os
+import shutil
+import tempfile
+import pandas as pd
+
+from AbstractGrader_tasks import TaskCancelled, _no_progress, _never_cancelled
+
+# Binary working formats, both need the optional pyarrow package
+BINARY_FORMATS = (".feather", ".parquet")
+
+def _file_format(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    return extension if extension in BINARY_FORMATS else ".csv"
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Feather and Parquet files require the pyarrow package (pip install pyarrow).")
+    return pyarrow
+
+def _read_table(file_path, columns=None):
+    # Memory-mapped, so only the requested columns are actually read from disk
+    pa = _import_pyarrow()
+    if _file_format(file_path) == ".feather":
+        return pa.feather.read_table(file_path, columns=columns, memory_map=True)
+    return pa.parquet.read_table(file_path, columns=columns, memory_map=True)
+
+def read_header(file_path):
+    # Only the column names, without reading any rows
+    if _file_format(file_path) == ".csv":
+        return read_csv_header(file_path)
+    pa = _import_pyarrow()
+    if _file_format(file_path) == ".feather":
+        with pa.memory_map(file_path) as source:
+            return list(pa.ipc.open_file(source).schema.names)
+    return list(pa.parquet.read_schema(file_path).names)
+
+def read_data_file(file_path, report_progress=_no_progress, is_cancelled=_never_cancelled, chunksize=50000,
+                   usecols=None, dtype=None):
+    # Read a CSV, Feather or Parquet file, optionally only some of its columns
+    if _file_format(file_path) == ".csv":
+        return read_csv_chunked(file_path, report_progress, is_cancelled, chunksize, usecols=usecols, dtype=dtype)
+    data = _read_table(file_path, columns=usecols).to_pandas()
+    if dtype is not None:
+        data = data.astype(dtype)
+    report_progress(1, 1)
+    return data
+
+def read_csv_header(file_path):
+    # Only the column names, without parsing any rows
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+def read_csv_chunked(file_path, report_progress=_no_progress, is_cancelled=_never_cancelled, chunksize=50000,
+                     usecols=None, dtype=None):
+    # Read a CSV in chunks so progress can be reported (in bytes) and the read can be cancelled in between.
+    # usecols/dtype allow loading only some columns, the row positions stay the same as in the full file.
+    total = os.path.getsize(file_path)
+    chunks = []
+    with open(file_path, "rb") as csv_file:
+        for chunk in pd.read_csv(csv_file, chunksize=chunksize, usecols=usecols, dtype=dtype):
+            if is_cancelled():
+                raise TaskCancelled()
+            chunks.append(chunk)
+            report_progress(min(csv_file.tell(), total), total)
+    report_progress(total, total)
+    if not chunks:
+        # Header only, read it again to keep the columns
+        return pd.read_csv(file_path, usecols=usecols, dtype=dtype)
+    return pd.concat(chunks, ignore_index=True)
+
+def write_data_file(data, save_path, report_progress=_no_progress, is_cancelled=_never_cancelled, chunksize=50000,
+                    source_path=None, source_store=None):
+    # Write to a temporary file next to the target and only rename it over the target once it is complete,
+    # so a crash or cancel never leaves a half-written file in place of the original.
+    # The format (CSV, Feather or Parquet) is picked from the file extension of save_path.
+    # With a source_path, data only holds some columns of that file: all other columns are streamed through
+    # from the source unchanged, the columns in data replace (or are added to) those of the source.
+    # A source_store (AbstractGrader_store) is streamed through the same way instead of a source file.
+    chunks = _output_chunks(data, source_path, chunksize, source_store)
+    directory = os.path.dirname(os.path.abspath(save_path))
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        if _file_format(save_path) == ".csv":
+            with os.fdopen(handle, "w", encoding="utf-8", newline="") as temp_file:
+                for start, chunk in chunks:
+                    if is_cancelled():
+                        raise TaskCancelled()
+                    chunk.to_csv(temp_file, header=(start == 0), index=False)
+                    report_progress(start + len(chunk), len(data))
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+        else:
+            os.close(handle)
+            _write_binary(chunks, temp_path, _file_format(save_path), len(data), report_progress, is_cancelled)
+            with open(temp_path, "rb+") as temp_file:
+                os.fsync(temp_file.fileno())
+        copy_permissions(temp_path, save_path)
+        os.replace(temp_path, save_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return save_path
+
+def copy_permissions(temp_path, target_path):
+    # Temporary files are only readable by their owner. A file that replaces another one gets its permissions,
+    # a new file those any other file created here would get.
+    if os.path.exists(target_path):
+        shutil.copymode(target_path, temp_path)
+    else:
+        # Reading the umask means setting it for the whole process, which would affect files created on
+        # other threads meanwhile. A file created with the default mode shows what the umask allows instead.
+        probe_path = temp_path + ".mode"
+        os.close(os.open(probe_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+        try:
+            shutil.copymode(probe_path, temp_path)
+        finally:
+            os.remove(probe_path)
+
+def _output_chunks(data, source_path, chunksize, source_store=None):
+    # Yields (first row position, DataFrame chunk) with the full set of columns to write
+    total = len(data)
+    if source_path is None and source_store is None:
+        if total == 0:
+            yield 0, data
+        for start in range(0, total, chunksize):
+            yield start, data.iloc[start:start + chunksize]
+        return
+
+    if source_store is not None:
+        source_chunks = source_store.chunks(chunksize)
+        source_name = source_store.path
+    else:
+        source_chunks = read_source_chunks(source_path, chunksize)
+        source_name = source_path
+
+    start = 0
+    for chunk in source_chunks:
+        end = start + len(chunk)
+        for column in data.columns:
+            chunk[column] = data[column].iloc[start:end].to_numpy()
+        yield start, chunk
+        start = end
+    if start == 0:
+        # Header only
+        header = source_store.header() if source_store is not None else read_header(source_path)
+        header += [column for column in data.columns if column not in header]
+        yield 0, pd.DataFrame(columns=header)
+    elif start != total:
+        raise ValueError(f"{source_name} has changed since it was loaded ({start} rows instead of {total}).")
+
+def read_source_chunks(file_path, chunksize=50000, report_progress=_no_progress, is_cancelled=_never_cancelled):
+    # All columns of a file in chunks, CSV columns as the text they were written as,
+    # so the untouched columns are written back exactly as they were
+    if _file_format(file_path) == ".csv":
+        total = os.path.getsize(file_path)
+        with open(file_path, "rb") as csv_file:
+            for chunk in pd.read_csv(csv_file, chunksize=chunksize, dtype=str, keep_default_na=False):
+                if is_cancelled():
+                    raise TaskCancelled()
+                yield chunk
+                report_progress(min(csv_file.tell(), total), total)
+        return
+    table = _read_table(file_path)
+    done = 0
+    for batch in table.to_batches(chunksize):
+        if is_cancelled():
+            raise TaskCancelled()
+        yield batch.to_pandas()
+        done += batch.num_rows
+        report_progress(done, table.num_rows)
+
+def _write_binary(chunks, temp_path, file_format, total, report_progress, is_cancelled):
+    pa = _import_pyarrow()
+    writer = None
+    try:
+        for start, chunk in chunks:
+            if is_cancelled():
+                raise TaskCancelled()
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                # An output column that is still empty in the first chunk would be typed as null
+                for i, field in enumerate(schema):
+                    if pa.types.is_null(field.type):
+                        schema = schema.set(i, field.with_type(pa.string()))
+                if file_format == ".feather":
+                    writer = pa.ipc.new_file(temp_path, schema)
+                else:
+                    writer = pa.parquet.ParquetWriter(temp_path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            report_progress(start + len(chunk), total)
+    finally:
+        if writer is not None:
+            writer.close()
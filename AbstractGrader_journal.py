@@ -0,0 +1,128 @@
+import json
+import os
+import time
+
+class GradingJournal:
+    # Append-only sidecar file next to the source CSV that records every label as soon as it is given.
+    # Replaying it on top of the source file restores a session after a crash without a full save.
+    def __init__(self, path, sync_every=20):
+        self.path = path
+        self.sync_every = sync_every  # fsync after this many records, flushes still happen on every record
+        self._file = None
+        self._unsynced = 0
+
+    @staticmethod
+    def path_for(source_path):
+        return source_path + ".journal"
+
+    def read(self):
+        # Yield all records in the order they were written
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a half-written last line, everything before it is still valid
+                    continue
+
+    def columns(self):
+        # Output columns that have journalled labels, in order of first appearance
+        return list(dict.fromkeys(record["column"] for record in self.read()))
+
+    def replay(self, data):
+        # Apply all journalled labels to the DataFrame, later records win. Returns the number of rows changed.
+        latest = {}
+        for record in self.read():
+            latest[(record["column"], record["row"])] = record["label"]
+
+        by_column = {}
+        for (column, row), label in latest.items():
+            by_column.setdefault(column, {})[row] = label
+
+        changed = 0
+        for column, labels in by_column.items():
+            if column not in data.columns:
+                data[column] = None
+            elif data[column].dtype != object:
+                # An empty column is read as float, which cannot hold the text labels
+                data[column] = data[column].astype(object)
+            # Skip rows that do not exist (anymore) in the source file
+            rows = [row for row in labels if row in data.index]
+            if rows:
+                data.loc[rows, column] = [labels[row] for row in rows]
+                changed += len(rows)
+        return changed
+
+    def label_times(self, column):
+        # Row -> time of its latest journalled label in the column, as seconds since the epoch
+        return {record["row"]: record["time"] for record in self.read() if record["column"] == column}
+
+    def append(self, row, column, label):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() and not self._ends_with_newline():
+                # A crash left a half-written last line, the next record must not be glued onto it
+                self._file.write("\n")
+        # numpy integers are not JSON serialisable
+        row = row.item() if hasattr(row, "item") else row
+        record = {"row": row, "column": column, "label": label, "time": time.time()}
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as journal_file:
+            journal_file.seek(-1, os.SEEK_END)
+            return journal_file.read(1) == b"\n"
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def mark(self):
+        # Position in the journal up to which its records are covered by a save that is about to start
+        if self._file is not None:
+            self._file.flush()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def truncate(self, size):
+        # Drop the records written after size, e.g. those of a session that is discarded
+        self.close()
+        if not os.path.exists(self.path):
+            return
+        if size:
+            os.truncate(self.path, size)
+        else:
+            os.remove(self.path)
+
+    def compact(self, upto=None):
+        # Compaction: once labels are part of the source file itself their records are no longer needed.
+        # Records written after `upto` (e.g. while a save was running) are kept.
+        self.close()
+        if not os.path.exists(self.path):
+            return
+        remaining = b""
+        if upto is not None:
+            with open(self.path, "rb") as journal_file:
+                journal_file.seek(upto)
+                remaining = journal_file.read()
+        if remaining:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb") as temp_file:
+                temp_file.write(remaining)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, self.path)
+        else:
+            os.remove(self.path)
@@ -0,0 +1,117 @@
+# Between the labels of one paper when several labels are allowed, in saved files and in the journal
+label_separator = "; "
+# Between a category and its subcategory, e.g. "Exclude/Wrong population"
+level_separator = "/"
+
+class CodingScheme:
+    # The categories papers are coded with. With one label per paper the output column is held as a pandas
+    # Categorical (small integer codes instead of a string per row), with several labels per paper as an
+    # integer bitmask (bit i set = categories[i] given, 0 = ungraded). Only saving turns it back into text.
+    # pandas is imported where it is needed, the main window builds its buttons from a scheme at startup.
+    max_multi_label = 63
+
+    def __init__(self, categories=(), multi_label=False):
+        self.categories = list(dict.fromkeys(categories))
+        self.multi_label = multi_label
+
+    def groups(self):
+        # Categories by parent category in their configured order, top-level categories under None
+        groups = {}
+        for category in self.categories:
+            parent, _, name = str(category).rpartition(level_separator)
+            groups.setdefault(parent or None, []).append((category, name))
+        return groups
+
+    def expand(self, labels):
+        # The given labels plus all known subcategories of them, so a parent category matches its children
+        prefixes = tuple(f"{label}{level_separator}" for label in labels)
+        return list(dict.fromkeys(list(labels) + [category for category in self.categories
+                                                  if str(category).startswith(prefixes)]))
+
+    def add(self, labels):
+        for label in labels:
+            if label not in self.categories:
+                self.categories.append(label)
+        if self.multi_label and len(self.categories) > self.max_multi_label:
+            raise ValueError(f"At most {self.max_multi_label} categories are possible with several labels per paper.")
+
+    def split(self, text):
+        # Labels of one saved multi-label value
+        return tuple(label.strip() for label in str(text).split(label_separator.strip()) if label.strip())
+
+    def normalize(self, label):
+        # Multi-label values are tuples in the order of the categories, so equal sets compare equal
+        if not self.multi_label:
+            return label
+        labels = self.split(label) if isinstance(label, str) else tuple(label)
+        self.add(labels)
+        return tuple(category for category in self.categories if category in labels)
+
+    def mask(self, labels):
+        self.add(labels)
+        return sum(1 << self.categories.index(label) for label in set(labels))
+
+    def labels_of(self, mask):
+        return tuple(category for bit, category in enumerate(self.categories) if int(mask) >> bit & 1)
+
+    def to_text(self, label):
+        # Stored form of a label for the journal and saved files
+        return label_separator.join(label) if isinstance(label, tuple) else label
+
+    def value(self, stored):
+        # Label(s) of one stored value, None if ungraded
+        if self.multi_label:
+            return self.labels_of(stored) or None
+        return None if stored != stored or stored is None else stored  # NaN is the only value unequal to itself
+
+    def encode(self, column):
+        # Text column (missing = ungraded) to the compact internal column
+        import numpy as np
+        import pandas as pd
+        texts = column[column.notna()].unique()
+        if not self.multi_label:
+            self.add(texts)
+            return pd.Series(pd.Categorical(column, categories=self.categories), index=column.index, name=column.name)
+        masks = {text: self.mask(self.split(text)) for text in texts}
+        return column.map(masks).fillna(0).astype(np.int64)
+
+    def decode(self, column):
+        # Internal column back to text, every distinct value is converted only once
+        if not self.multi_label:
+            return column.astype(object)
+        texts = {mask: self.to_text(self.labels_of(mask)) for mask in column[column != 0].unique()}
+        return column.map(texts).astype(object)
+
+    def set(self, data, output_col, row, label):
+        # Write the label(s) of one row in place
+        if self.multi_label:
+            data.at[row, output_col] = self.mask(label)
+            return
+        if label not in data[output_col].cat.categories:
+            self.add([label])
+            data[output_col] = data[output_col].cat.add_categories([label])
+        data.at[row, output_col] = label
+
+    def graded(self, column):
+        return column != 0 if self.multi_label else column.notna()
+
+    def counts(self, column):
+        # Rows per label, a row with several labels counts for each of them
+        if not self.multi_label:
+            counts = column.value_counts()
+            return {label: int(count) for label, count in counts.items() if count}
+        masks = column.to_numpy()
+        counts = {}
+        for bit, category in enumerate(self.categories):
+            count = int(((masks >> bit) & 1).sum())
+            if count:
+                counts[category] = count
+        return counts
+
+    def has_any(self, column, labels):
+        # Rows that have at least one of the labels or one of their subcategories
+        labels = self.expand(labels)
+        if not self.multi_label:
+            return column.isin(labels)
+        mask = sum(1 << bit for bit, category in enumerate(self.categories) if category in labels)
+        return (column & mask) != 0
@@ -1,28 +1,99 @@
 import sys
 import configparser
 import os
-import random
-import pandas as pd
+import re
+import time
+from collections import deque
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QButtonGroup, QLabel, QFrame, QSizePolicy, 
                                QFileDialog, QMessageBox, QProgressBar, QScrollArea)
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QThreadPool, QTimer
 from PySide6.QtGui import QFont
 
 from AbstractGrader_options import OptionsWindow
 from AbstractGrader_selector import ColumnSelectionDialog
+from AbstractGrader_worker import Worker
+from AbstractGrader_render import RenderCache, render_text
+from AbstractGrader_highlight import Highlighter, parse_terms
+from AbstractGrader_labels import CodingScheme
+from AbstractGrader_bibliography import is_bibliography
+from AbstractGrader_perf import timed
+import AbstractGrader_perf
 
 # Define the path for the .ini file in the same directory as the script
 config_path = os.path.join(os.path.dirname(__file__), 'settings.ini')
+# Feather and Parquet are binary working formats that need the optional pyarrow package
+file_filter = "CSV Files (*.csv);;Feather Files (*.feather);;Parquet Files (*.parquet)"
+# RIS, BibTeX and PubMed exports can be opened too, they are converted to a CSV file next to them
+bibliography_filter = "Bibliography Files (*.ris *.bib *.nbib *.txt)"
+open_file_filter = ("Data Files (*.csv *.feather *.parquet *.ris *.bib *.nbib *.txt);;" + file_filter + ";;"
+                    + bibliography_filter)
+# Number of upcoming rows whose display text is prepared ahead of time, and of graded rows kept for "Back"
+prefetch_rows = 5
+history_length = 20
+# Number of scores after which the relevance ranking is retrained in the background
+retrain_every = 25
+
+# pandas and NumPy take most of the startup time, so the modules that need them (core, ranker, dedup)
+# are only imported once a file is opened, preferably on the worker thread that loads it
+def load_session(file_path, columns=None, string_dtype=False, **kwargs):
+    from AbstractGrader_core import GradingSession
+    return GradingSession.load(file_path, columns, string_dtype, **kwargs)
+
+def import_bibliography(file_path, columns=None, string_dtype=False, **kwargs):
+    # Convert a RIS/BibTeX/NBIB export into its CSV working file the first time it is opened, that file
+    # holds the labels from then on and is loaded like any other
+    from AbstractGrader_bibliography import converted_path, convert_bibliography
+    csv_path = converted_path(file_path)
+    if not os.path.exists(csv_path):
+        convert_bibliography(file_path, csv_path, kwargs["report_progress"], kwargs["is_cancelled"])
+    return load_session(csv_path, columns, string_dtype, **kwargs)
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.csv_data = None  # Initialize csv_data as None
-        self.unsaved_changes = False  # Flag to track unsaved changes
+        self.session = None  # The loaded file with its labels, queue and journal (AbstractGrader_core)
+        self.queue_seed = None  # Optional seed from settings.ini for a reproducible row order
+        self.current_row_index = None
         self.save_in_progress = False  # Flag to track if save operation is in progress
+        self.close_after_save = False  # Close the window once the running save has finished
+        self.active_worker = None  # Background load/save task, only one runs at a time
+        self.column_projection = False  # Only load the title, abstract and output columns (settings.ini)
+        self.string_dtype = False  # Load title and abstract with the compact pandas string dtype (settings.ini)
+        self.sqlite_store = False  # Import files into a SQLite store next to them and grade from there (settings.ini)
+        self.sqlite_wal = True  # Write-ahead logging for the store, only works if all instances run on one computer
+        self.import_output_column = "Label"  # Output column of imported RIS/BibTeX/NBIB files (settings.ini)
+        self.render_cache = RenderCache(self.render_row, capacity=prefetch_rows + history_length + 1)
+        self.history = deque(maxlen=history_length)  # Recently graded rows, most recent last
+        self.prefetch_timer = QTimer(self)  # Fires once control is back in the event loop
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(0)
+        self.prefetch_timer.timeout.connect(self.prefetch_next_rows)
+        self.reviewers = 1  # Number of reviewers the dataset is split between (settings.ini)
+        self.reviewer = 1  # Which of them this is, 1-based
+        self.reviewer_overlap = 0.0  # Share of rows every reviewer grades, to measure agreement
+        self.include_terms = ""  # Terms highlighted in title and abstract, one per line
+        self.exclude_terms = ""
+        self.highlighter = None  # Compiled matcher for all terms, rebuilt when the terms change
+        self.ranking_enabled = False  # Serve likely relevant rows first (settings.ini)
+        self.relevant_labels = []  # Labels that count as relevant for the ranking, defaults to the first button
+        self.ranker_worker = None  # Background build/retrain of the ranking, runs next to loads and saves
+        self.scores_since_retrain = 0
+        self.deduplicate = False  # Group near-duplicate rows and only show one of each group (settings.ini)
+        self.duplicate_threshold = 0.8  # Minimum estimated Jaccard similarity of near-duplicates
+        self.dedup_worker = None
+        self.button_labels = []  # Full category of every button, subcategories as "Parent/Child"
+        self.multi_label = False  # Several labels per paper instead of one (settings.ini / options)
+        self.review_window = None  # Search over the graded rows to change earlier scores
+        self.search_index_enabled = True  # Build the search index for the review after loading (settings.ini)
+        self.index_worker = None
+        self.performance_window = None  # Timings of the UI actions, if enabled in settings.ini
+        self.restore_session = True  # Reopen the last file on startup (settings.ini)
+        self.last_session = None  # File path, selected columns and shown row of the last session
         self.initUI()
         self.load_settings()
+        if self.restore_session and self.last_session is not None:
+            self.reopen_last_session()
 
     def initUI(self):
         self.setWindowTitle("Abstract Grader")
@@ -45,16 +116,27 @@ class MainWindow(QMainWindow):
         options_button.clicked.connect(self.show_options_window)
         save_button = QPushButton("Save File")
         save_button.clicked.connect(self.save_csv)
+        review_button = QPushButton("Review")
+        review_button.clicked.connect(self.show_review_window)
+
+        # Only shown when the performance instrumentation is enabled in settings.ini
+        self.performance_button = QPushButton("Performance")
+        self.performance_button.clicked.connect(self.show_performance_window)
+        self.performance_button.hide()
 
         # Add buttons to the horizontal layout
         options_layout.addWidget(load_button)
         options_layout.addWidget(options_button)
         options_layout.addWidget(save_button)
+        options_layout.addWidget(review_button)
+        options_layout.addWidget(self.performance_button)
 
         # Set stretch factors to make buttons fill the width equally
         options_layout.setStretch(0, 1)  # Save File button
         options_layout.setStretch(1, 1)  # Options button
         options_layout.setStretch(2, 1)  # Load File button
+        options_layout.setStretch(3, 1)  # Review button
+        options_layout.setStretch(4, 1)  # Performance button
 
         # Add the top bar layout to the main vertical layout
         main_layout.addLayout(options_layout)
@@ -75,6 +157,7 @@ class MainWindow(QMainWindow):
         self.cont_title = QLabel("Initial Text 1")
         self.cont_title.setStyleSheet("color: black;")
         self.cont_title.setWordWrap(True)
+        self.cont_title.setTextFormat(Qt.RichText)  # Text is HTML-escaped in render_row
         cont_title_layout.addWidget(self.cont_title)
         cont_title_frame.setLayout(cont_title_layout)
         cont_title_frame.setFixedHeight(50)  # Approx. two rows of text
@@ -97,6 +180,7 @@ class MainWindow(QMainWindow):
         self.cont_abstract = QLabel("Initial Text 2")
         self.cont_abstract.setStyleSheet("color: black;")
         self.cont_abstract.setWordWrap(True)
+        self.cont_abstract.setTextFormat(Qt.RichText)  # Text is HTML-escaped in render_row
         cont_abstract_layout.addWidget(self.cont_abstract)
         cont_abstract_frame.setLayout(cont_abstract_layout)
         cont_abstract_frame.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
@@ -130,115 +214,365 @@ class MainWindow(QMainWindow):
         cont_rq_frame.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         main_layout.addWidget(cont_rq_frame)
 
-        answer_layout = QHBoxLayout()
+        # One row of category buttons, plus one row per parent category with subcategories
+        self.answer_layout = QVBoxLayout()
         # Create a QButtonGroup to enforce exclusivity
         self.button_group = QButtonGroup(self)
         self.button_group.setExclusive(True)
-        # Create buttons and add them to the button widget and button group
         self.buttons = []
-        for i in range(5):
-            button = QPushButton(f"Button {i+1}")
-            button.setCheckable(True)
-            self.button_group.addButton(button)
-            answer_layout.addWidget(button)
-            self.buttons.append(button)
-
-            # Connect the button's clicked signal to the slot that handles the color change
-            button.clicked.connect(self.mono_choice_select)
+        self.update_button_texts([f"Button {i+1}" for i in range(5)])
 
         # Add the button widget to the central layout
-        main_layout.addLayout(answer_layout)
+        main_layout.addLayout(self.answer_layout)
+
+        commit_layout = QHBoxLayout()
+        # Button to go back to recently graded rows
+        self.back_button = QPushButton("Back")
+        self.back_button.setFixedHeight(self.back_button.sizeHint().height() * 2)
+        self.back_button.setEnabled(False)
+        self.back_button.clicked.connect(self.show_previous_row)
+        commit_layout.addWidget(self.back_button)
 
         self.commit_button = QPushButton("Start")
         self.commit_button.setFixedHeight(self.commit_button.sizeHint().height() * 2)  # adjust height to be bigger
-        main_layout.addWidget(self.commit_button)
+        commit_layout.addWidget(self.commit_button, 1)
         self.commit_button.clicked.connect(self.handle_commit)
+        main_layout.addLayout(commit_layout)
 
-        # Add progress bar
+        # Add progress bar, with a cancel button that is only shown while a file is loaded or saved
+        progress_layout = QHBoxLayout()
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
         self.progress_bar.setTextVisible(True)  # Optional: Show percentage in the progress bar
-        main_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.progress_bar)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_worker)
+        self.cancel_button.hide()
+        progress_layout.addWidget(self.cancel_button)
+        main_layout.addLayout(progress_layout)
 
         # Set the main layout to the central widget
         central_widget.setLayout(main_layout)
 
     def show_options_window(self):
-        # Get the current button texts
-        button_texts = [button.text() for button in self.buttons]
-
         # Get the current research question text
         rq_text = self.cont_rq.text()
 
         # Open the options window, passing current texts
-        options_window = OptionsWindow(self, button_texts=button_texts, rq_text=rq_text, config_path = config_path)
+        options_window = OptionsWindow(self, button_texts=self.button_labels, rq_text=rq_text, config_path = config_path,
+                                       include_terms=self.include_terms, exclude_terms=self.exclude_terms,
+                                       multi_label=self.multi_label)
         options_window.exec()
 
+    def show_review_window(self):
+        if self.session is None or self.session.scheme is None:
+            QMessageBox.warning(self, "No CSV Loaded", "Please load a CSV file before reviewing.")
+            return
+        from AbstractGrader_review import ReviewWindow
+        if self.review_window is None:
+            self.review_window = ReviewWindow(self)
+        self.review_window.show()
+        self.review_window.raise_()
+
+    def show_performance_window(self):
+        from AbstractGrader_perfwindow import PerformanceWindow
+        if self.performance_window is None:
+            self.performance_window = PerformanceWindow(self)
+        self.performance_window.show()
+        self.performance_window.raise_()
+
+    @timed("load_csv")
     def load_csv(self):
+        if self.active_worker is not None:
+            QMessageBox.warning(self, "Busy", "Please wait until the current load or save has finished.")
+            return
+
         file_dialog = QFileDialog()
-        file_path, _ = file_dialog.getOpenFileName(self, "Open CSV", "", "CSV Files (*.csv)")
+        file_path, _ = file_dialog.getOpenFileName(self, "Open CSV", "", open_file_filter)
 
         if file_path:
-            try:
-                # Load CSV file using pandas
-                self.csv_data = pd.read_csv(file_path)
-                self.csv_file_path = file_path
-
-                # Open the combined column selection and output dialog
-                combined_dialog = ColumnSelectionDialog(self.csv_data.columns)
-                if combined_dialog.exec():
-                    title_col, abstract_col, output_col = combined_dialog.get_selected_columns()
-                    # Store selected columns as instance variables
-                    self.title_col = title_col
-                    self.abstract_col = abstract_col
-                    self.output_col = output_col
-
-                    if output_col not in self.csv_data.columns:
-                        # Add new column to the DataFrame
-                        self.csv_data[output_col] = None  # Initialize new column with empty values
-
-                else:
-                    QMessageBox.warning(self, "Cancelled", "Column selection cancelled.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to load CSV file: {str(e)}")
+            if is_bibliography(file_path):
+                self.open_bibliography(file_path)
+                return
+            if self.projects_columns():
+                self.load_csv_projected(file_path)
+                return
+            # Load CSV file using pandas on a worker thread, continues in on_csv_loaded
+            self.start_worker(Worker(load_session, file_path, store=self.sqlite_store, wal=self.sqlite_wal),
+                              "Loading file", on_finished=self.on_csv_loaded,
+                              on_error=self.on_load_failed)
+
+    def projects_columns(self):
+        # The SQLite store always loads only the selected columns, saving exports the others from its papers table
+        return self.column_projection or self.sqlite_store
+
+    def load_csv_projected(self, file_path):
+        # Only read the header for the column selection, then load just the selected columns.
+        # The other columns stay on disk and are streamed through from the source file on save.
+        from AbstractGrader_core import GradingSession
+        try:
+            selection = self.select_columns(GradingSession.available_columns(file_path, store=self.sqlite_store))
+        except Exception as e:
+            self.on_load_failed(str(e))
+            return
+        if selection is None:
+            return
+
+        self.start_worker(Worker(load_session, file_path, columns=selection, string_dtype=self.string_dtype,
+                                 store=self.sqlite_store, wal=self.sqlite_wal),
+                          "Loading file", on_finished=lambda session: self.on_csv_loaded(session, selection),
+                          on_error=self.on_load_failed)
+
+    def open_bibliography(self, file_path):
+        # Title and abstract columns of a converted export are always the same, so there is no column dialog
+        from AbstractGrader_bibliography import COLUMNS, converted_path, is_outdated, set_aside
+        csv_path = converted_path(file_path)
+        is_open = self.session is not None and os.path.abspath(self.session.file_path) == os.path.abspath(csv_path)
+        if is_outdated(file_path, csv_path) and not is_open:
+            # The search was probably run again, its new records are not in the working file
+            reply = QMessageBox.question(self, 'Changed Export',
+                                         f'{os.path.basename(file_path)} was changed after '
+                                         f'{os.path.basename(csv_path)} was created from it. Convert it again? '
+                                         'The current working file and its scores are kept under a new name.',
+                                         QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.Yes)
+            if reply == QMessageBox.Cancel:
+                return
+            if reply == QMessageBox.Yes:
+                try:
+                    old_path = set_aside(csv_path)
+                except OSError as e:
+                    self.on_load_failed(str(e))
+                    return
+                QMessageBox.information(self, 'Changed Export',
+                                        f'The previous working file was renamed to {os.path.basename(old_path)}.')
+        selection = (COLUMNS[0], COLUMNS[1], self.import_output_column)
+        columns = selection if self.projects_columns() else None
+        self.start_worker(Worker(import_bibliography, file_path, columns=columns, string_dtype=self.string_dtype,
+                                 store=self.sqlite_store, wal=self.sqlite_wal),
+                          "Importing file", on_finished=lambda session: self.on_csv_loaded(session, selection),
+                          on_error=self.on_load_failed)
+
+    def on_csv_loaded(self, session, selection=None):
+        try:
+            # Labels from a previous session that were never saved have been restored from the journal
+            if self.session is not None:
+                self.session.close()
+            self.session = session
+
+            # Open the combined column selection and output dialog, unless the columns were picked before loading
+            if selection is None:
+                selection = self.select_columns(session.data.columns)
+            if selection is not None:
+                self.start_grading(*selection)
+        except Exception as e:
+            self.on_load_failed(str(e))
+
+    def reopen_last_session(self):
+        # Load the file of the last session in the background with the columns picked back then,
+        # grading continues where it stopped without any dialogs
+        file_path, selection, row = self.last_session
+        if not os.path.exists(file_path):
+            return
+        columns = selection if self.projects_columns() else None
+        self.start_worker(Worker(load_session, file_path, columns=columns, string_dtype=self.string_dtype,
+                                 store=self.sqlite_store, wal=self.sqlite_wal),
+                          "Reopening last file",
+                          on_finished=lambda session: self.on_session_reopened(session, selection, row),
+                          on_error=self.on_load_failed)
+
+    def on_session_reopened(self, session, selection, row):
+        title_col, abstract_col, output_col = selection
+        if title_col not in session.data.columns or abstract_col not in session.data.columns:
+            session.close()
+            QMessageBox.warning(self, "Last File", "The columns of the last session are no longer in the file.")
+            return
+        self.on_csv_loaded(session, selection)
+        # Show the row that was on screen when the program was closed, if it is still ungraded
+        self.load_next_row(row if row in session.pending_rows else None)
+
+    def on_load_failed(self, message):
+        QMessageBox.critical(self, "Error", f"Failed to load CSV file: {message}")
+
+    def select_columns(self, columns):
+        combined_dialog = ColumnSelectionDialog(columns)
+        if combined_dialog.exec():
+            return combined_dialog.get_selected_columns()
+        QMessageBox.warning(self, "Cancelled", "Column selection cancelled.")
+        return None
+
+    def start_grading(self, title_col, abstract_col, output_col):
+        # Build the queue of ungraded rows (of this reviewer's share) and the counters
+        self.session.start(title_col, abstract_col, output_col, seed=self.queue_seed, reviewers=self.reviewers,
+                           reviewer=self.reviewer, overlap=self.reviewer_overlap, scheme=self.coding_scheme())
+        self.current_row_index = None
+        self.save_session_settings()
+        self.render_cache.clear()
+        self.history.clear()
+        self.back_button.setEnabled(False)
+        self.update_progress_bar()
+
+        # Rows are served at random until the ranking is ready
+        if self.ranking_enabled:
+            self.train_ranker()
+
+        # Near-duplicates are shown until they have been found in the background
+        if self.deduplicate:
+            self.start_deduplication()
+
+        # Text searches in the review scan all rows until the index is ready
+        if self.search_index_enabled:
+            self.start_indexing()
 
+    @timed("save_csv")
     def save_csv(self):
-        if self.csv_data is not None:
+        if self.session is not None and self.session.output_col is not None:
+            if self.active_worker is not None:
+                QMessageBox.warning(self, "Busy", "Please wait until the current load or save has finished.")
+                self.close_after_save = False
+                return
             file_dialog = QFileDialog()
-            save_path, _ = file_dialog.getSaveFileName(self, "Save CSV", "", "CSV Files (*.csv)")
+            # Saving as Feather/Parquet creates a working copy that opens much faster than the CSV,
+            # saving as CSV again is the export
+            save_path, selected_filter = file_dialog.getSaveFileName(self, "Save CSV", "", file_filter)
+            if save_path and not os.path.splitext(save_path)[1]:
+                # Add the extension of the chosen file type, it decides the format that is written
+                save_path += selected_filter[selected_filter.index("*") + 1:-1]
             if save_path:
-                try:
-                    # Save the data to a new CSV file
-                    self.csv_data.to_csv(save_path, index=False)
-                    QMessageBox.information(self, "File Saved", f"File saved successfully to {save_path}")
-                    self.unsaved_changes = False
-                    self.save_in_progress = False
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to save CSV file: {str(e)}")
+                # Save a snapshot so grading can continue while the file is written
+                session = self.session
+                snapshot, saved_change_count, journal_mark = session.snapshot()
+
+                self.save_in_progress = True
+                self.start_worker(Worker(session.write, snapshot, save_path), "Saving file",
+                                  on_finished=lambda imported: self.on_csv_saved(session, save_path,
+                                                                                 saved_change_count, journal_mark,
+                                                                                 imported),
+                                  on_error=self.on_save_failed, on_cancelled=self.on_save_failed)
+            else:
+                self.close_after_save = False
         else:
             QMessageBox.warning(self, "No CSV Loaded", "Please load a CSV file before saving.")
 
+    def on_csv_saved(self, session, save_path, saved_change_count, journal_mark, imported):
+        self.save_in_progress = False
+        # Compacts the journal if the source file was overwritten. Scores submitted while the save
+        # was running are not part of the file yet.
+        session.saved(save_path, saved_change_count, journal_mark, imported)
+        if self.close_after_save:
+            self.close_after_save = False
+            self.close()
+        else:
+            QMessageBox.information(self, "File Saved", f"File saved successfully to {save_path}")
+
+    def on_save_failed(self, message=None):
+        self.save_in_progress = False
+        self.close_after_save = False
+        if message:
+            QMessageBox.critical(self, "Error", f"Failed to save CSV file: {message}")
+
+    def start_worker(self, worker, description, on_finished, on_error, on_cancelled=None):
+        # Run a load/save task in the background and show its progress in the progress bar
+        self.active_worker = worker
+        self.task_description = description
+        self.task_started = time.perf_counter()
+        worker.signals.progress.connect(self.show_worker_progress)
+        for signal, handler in ((worker.signals.finished, on_finished), (worker.signals.error, on_error),
+                                (worker.signals.cancelled, on_cancelled)):
+            signal.connect(lambda *args, handler=handler: self.finish_worker(worker, handler, *args))
+        self.progress_bar.setMaximum(1000)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat(f"{description}...")
+        self.cancel_button.show()
+        QThreadPool.globalInstance().start(worker)
+
+    def show_worker_progress(self, done, total):
+        # Scaled to permille, byte counts of large files do not fit the progress bar's int range
+        self.progress_bar.setValue(int(done * 1000 / total) if total else 1000)
+        self.progress_bar.setFormat(f"{self.task_description}... %p%")
+
+    def finish_worker(self, worker, handler, *args):
+        # The worker is passed in so it stays alive until its handler has run, active_worker is cleared here.
+        # Reset the progress bar first, the handler may open dialogs
+        self.active_worker = None
+        if AbstractGrader_perf.recorder is not None:
+            # The whole background task, from starting it to its result arriving on the GUI thread
+            AbstractGrader_perf.recorder.record(self.task_description, self.task_started,
+                                                time.perf_counter() - self.task_started)
+        self.cancel_button.hide()
+        self.progress_bar.setMaximum(100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
+        self.update_progress_bar()
+        if handler is not None:
+            handler(*args)
+
+    def cancel_worker(self):
+        if self.active_worker is not None:
+            self.active_worker.cancel()
+
     def update_button_texts(self, texts):
-        # Remove buttons that don't have corresponding text
-        for i, button in enumerate(self.buttons):
-            if i < len(texts):  # Update button text if a non-empty text exists
-                button.setText(texts[i])
-                button.show()  # Make sure the button is visible
-            else:
-                button.hide()  # Hide the button if there's no corresponding text
+        # Rebuild the category buttons, any number of them. Subcategories ("Parent/Child") get a row
+        # per parent category and only show their own name.
+        for button in self.buttons:
+            self.button_group.removeButton(button)
+        while self.answer_layout.count():
+            row_layout = self.answer_layout.takeAt(0).layout()
+            while row_layout.count():
+                row_layout.takeAt(0).widget().deleteLater()
+            row_layout.deleteLater()
+
+        self.buttons = []
+        self.button_labels = []
+        for parent, categories in CodingScheme(texts).groups().items():
+            row_layout = QHBoxLayout()
+            if parent is not None:
+                row_layout.addWidget(QLabel(f"{parent}:"))
+            for category, name in categories:
+                button = QPushButton(name)
+                button.setCheckable(True)
+                self.button_group.addButton(button)
+                row_layout.addWidget(button)
+                self.buttons.append(button)
+                self.button_labels.append(category)
+                # Connect the button's clicked signal to the slot that handles the color change
+                button.clicked.connect(self.mono_choice_select)
+            self.answer_layout.addLayout(row_layout)
+        self.update_coding_scheme()
+
+    def set_multi_label(self, multi_label):
+        self.multi_label = multi_label
+        self.button_group.setExclusive(not multi_label)
+        self.update_coding_scheme()
+
+    def coding_scheme(self):
+        return CodingScheme(self.button_labels, self.multi_label)
+
+    def update_coding_scheme(self):
+        # Apply changed categories to the file being graded, labels that are no longer a button are kept
+        if self.session is not None and self.session.scheme is not None:
+            self.session.set_scheme(self.coding_scheme())
+            self.update_progress_bar()
     
     def update_rq_text(self, rq_text):
         self.cont_rq.setText(rq_text)
 
+    def update_highlight_terms(self, include_terms, exclude_terms):
+        # Compile the matcher once for all rows, raises re.error for invalid regular expressions
+        highlighter = Highlighter(parse_terms(include_terms), parse_terms(exclude_terms))
+        self.include_terms = include_terms
+        self.exclude_terms = exclude_terms
+        self.highlighter = highlighter if highlighter else None
+        # Rendered rows are cached with the old highlighting
+        self.render_cache.clear()
+        if self.current_row_index is not None:
+            self.show_row(self.current_row_index)
+
     def mono_choice_select(self):
-        # Reset all buttons to default style
+        # Highlight the selected button(s), reset all others to default style
         for button in self.buttons:
-            button.setStyleSheet("")
-        # Set the selected button's style
-        selected_button = self.button_group.checkedButton()
-        if selected_button:
-            selected_button.setStyleSheet("background-color: lightblue; color: black;")
+            button.setStyleSheet("background-color: lightblue; color: black;" if button.isChecked() else "")
 
+    @timed("handle_commit")
     def handle_commit(self):
         if self.commit_button.text() == "Start":
             self.load_next_row()
@@ -250,89 +584,363 @@ class MainWindow(QMainWindow):
         for button in self.buttons:
             button.setChecked(False)
             button.setStyleSheet("")
-        self.button_group.setExclusive(True) # re-enable once all are unchecked, which works somehow
+        self.button_group.setExclusive(not self.multi_label) # re-enable once all are unchecked, which works somehow
 
-    def load_next_row(self):
-        # Find rows where output_col is None
-        empty_rows = self.csv_data[self.csv_data[self.output_col].isna()]
-        if empty_rows.empty:
+    @timed("load_next_row")
+    def load_next_row(self, row=None):
+        # Draw the next ungraded row from the queue, unless a row is given
+        if self.session is None or self.session.pending_rows is None or len(self.session.pending_rows) == 0:
             QMessageBox.information(self, "No Rows", "No empty Rows left in CSV.")
             return
 
-        # Randomly pick one row
-        self.current_row_index = random.choice(empty_rows.index)
-        selected_row = self.csv_data.loc[self.current_row_index]
-
-        # Update QLabel texts
-        self.cont_title.setText(selected_row[self.title_col])
-        self.cont_abstract.setText(selected_row[self.abstract_col])
+        self.current_row_index = self.session.next_row() if row is None else row
+        self.show_row(self.current_row_index)
 
         # Change button label
         self.commit_button.setText("Submit score")
         # Update progress bar
         self.update_progress_bar()
+        # Prepare the next rows once the current one is on screen
+        self.prefetch_timer.start()
 
+    def render_row(self, index):
+        title, abstract = self.session.text(index)
+        title = render_text(title, self.highlighter)
+        if index in self.session.duplicates:
+            title += f" <i>(+{len(self.session.duplicates[index])} near-duplicates)</i>"
+        return (title, render_text(abstract, self.highlighter))
+
+    def show_row(self, index):
+        # Update QLabel texts
+        title, abstract = self.render_cache.get(index)
+        self.cont_title.setText(title)
+        self.cont_abstract.setText(abstract)
+
+    @timed("prefetch_next_rows")
+    def prefetch_next_rows(self):
+        if self.session is not None and self.session.pending_rows is not None:
+            self.render_cache.prefetch(self.session.candidates(prefetch_rows + 1))
+
+    def relevant_label_list(self):
+        return self.relevant_labels or self.button_labels[:1]
+
+    def is_relevant(self, label):
+        # Relevant if any of the labels is a relevant category or one of its subcategories
+        relevant = self.session.scheme.expand(self.relevant_label_list())
+        return any(label in relevant for label in (label if isinstance(label, tuple) else (label,)))
+
+    def train_ranker(self):
+        # (Re)build the ranking on a worker thread from all scores given so far, grading continues meanwhile
+        if self.ranker_worker is not None:
+            return
+        from AbstractGrader_ranker import train_ranker
+        session = self.session
+        graded = session.graded_rows()
+        relevant = session.label_mask(self.relevant_label_list())[graded].to_numpy()
+        if session.ranker is None:
+            worker = Worker(train_ranker, session.data[session.title_col], session.data[session.abstract_col],
+                            graded, relevant)
+        else:
+            worker = Worker(session.ranker.retrain, graded, relevant)
+        ranker = session.ranker
+        worker.signals.finished.connect(lambda result: self.on_ranker_trained(worker, session, ranker, result))
+        worker.signals.error.connect(lambda message: self.on_ranker_failed(worker, message))
+        self.ranker_worker = worker
+        self.scores_since_retrain = 0
+        QThreadPool.globalInstance().start(worker)
+
+    def on_ranker_trained(self, worker, session, ranker, result):
+        self.ranker_worker = None
+        if session is not self.session or ranker is not session.ranker:
+            return  # A different file was loaded in the meantime
+        if ranker is None:
+            session.ranker = result
+        else:
+            session.ranker.apply(result)
+        self.update_progress_bar()
+
+    def start_deduplication(self):
+        # Group near-duplicates on a worker thread, grading continues meanwhile
+        if self.dedup_worker is not None:
+            self.dedup_worker.cancel()
+        from AbstractGrader_dedup import find_duplicates
+        session = self.session
+        worker = Worker(find_duplicates, session.data[session.title_col], session.data[session.abstract_col],
+                        self.duplicate_threshold)
+        worker.signals.finished.connect(lambda clusters: self.on_duplicates_found(worker, session, clusters))
+        worker.signals.error.connect(lambda message: self.on_duplicates_failed(worker, message))
+        self.dedup_worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def on_duplicates_found(self, worker, session, clusters):
+        if worker is not self.dedup_worker:
+            return
+        self.dedup_worker = None
+        if session is not self.session:
+            return  # A different file was loaded in the meantime
+        # Keeps the row that is already on screen in the queue, the other rows of its group leave it
+        session.set_duplicates(clusters, self.current_row_index)
+        self.render_cache.clear()
+        if self.current_row_index is not None:
+            self.show_row(self.current_row_index)
+
+    def start_indexing(self):
+        # Build the inverted index of title and abstract on a worker thread, grading continues meanwhile
+        if self.index_worker is not None:
+            self.index_worker.cancel()
+        from AbstractGrader_search import build_search_index
+        session = self.session
+        worker = Worker(build_search_index, session.data[session.title_col], session.data[session.abstract_col])
+        worker.signals.finished.connect(lambda index: self.on_index_built(worker, session, index))
+        worker.signals.error.connect(lambda message: self.on_index_failed(worker, message))
+        self.index_worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def on_index_built(self, worker, session, index):
+        if worker is self.index_worker:
+            self.index_worker = None
+            session.search_index = index
+
+    def on_index_failed(self, worker, message):
+        # Searching still works without the index, only slower
+        if worker is self.index_worker:
+            self.index_worker = None
+            QMessageBox.warning(self, "Search", f"Failed to build the search index, searching is slower: {message}")
+
+    def on_duplicates_failed(self, worker, message):
+        if worker is self.dedup_worker:
+            self.dedup_worker = None
+            QMessageBox.warning(self, "Duplicates", f"Failed to find near-duplicates: {message}")
+
+    def on_ranker_failed(self, worker, message):
+        self.ranker_worker = None
+        QMessageBox.warning(self, "Ranking", f"Failed to rank the rows by relevance: {message}")
+
+    def show_previous_row(self):
+        # Show the most recently graded row again so its score can be changed
+        if not self.history:
+            return
+        self.show_graded_row(self.history.pop())
+        self.back_button.setEnabled(bool(self.history))
+
+    def show_graded_row(self, row):
+        # Show an already graded row, e.g. from the review, so its score can be changed
+        self.current_row_index = row
+        self.show_row(row)
+        self.commit_button.setText("Submit score")
+
+        # Preselect the score(s) it was given
+        label = self.session.get_label(self.current_row_index)
+        labels = label if isinstance(label, tuple) else (label,)
+        for button, category in zip(self.buttons, self.button_labels):
+            button.setChecked(category in labels)
+        self.mono_choice_select()
+
+    @timed("submit_score")
     def submit_score(self):
         if self.current_row_index is None:
             print("No row selected.")
             return
         
-        # Get the text from the selected button
-        selected_button = self.button_group.checkedButton()
-        if selected_button is None:
+        # Get the category of the selected button(s)
+        selected = [category for button, category in zip(self.buttons, self.button_labels) if button.isChecked()]
+        if not selected:
             QMessageBox.warning(self, "Selection", "No Score selected!")
             return
-        selected_text = selected_button.text()
-        # Update the DataFrame
-        self.csv_data.at[self.current_row_index, self.output_col] = selected_text
-        self.unsaved_changes = True
+        selected_text = tuple(selected) if self.multi_label else selected[0]
+        # Update the DataFrame, the counters and the journal. Near-duplicates of this row get the same score.
+        self.session.label(self.current_row_index, selected_text)
+        self.history.append(self.current_row_index)
+        self.back_button.setEnabled(True)
+        # Keep the review's results up to date with the new score
+        if self.review_window is not None and self.review_window.isVisible():
+            self.review_window.search()
+
+        # Learn from the new score right away, and retrain on all scores every now and then
+        if self.session.ranker is not None:
+            ready = self.session.ranker.ready()
+            self.session.ranker.update(self.current_row_index, self.is_relevant(selected_text))
+            self.scores_since_retrain += 1
+            # The first score of the second class makes the ranking meaningful, rank right away
+            if self.scores_since_retrain >= retrain_every or ready != self.session.ranker.ready():
+                self.train_ranker()
 
         # Load the next row
         self.load_next_row()
 
+    @timed("update_progress_bar")
     def update_progress_bar(self):
-        if self.output_col:
-            total_rows = len(self.csv_data)
-            non_empty_rows = len(self.csv_data[self.csv_data[self.output_col].notna()])
+        if self.session is not None and self.session.stats is not None and self.active_worker is None:
+            stats = self.session.stats
+            ranker = self.session.ranker
+            total_rows = stats.total
+            non_empty_rows = stats.graded
             self.progress_bar.setMaximum(total_rows)
             self.progress_bar.setValue(non_empty_rows)
             self.progress_bar.setFormat(f"{non_empty_rows}/{total_rows} rows completed")
+            # Per-category breakdown on hover
+            breakdown = stats.breakdown()
+            if ranker is not None and ranker.recent_relevance() is not None:
+                # Once this drops towards zero, most relevant papers have likely been found
+                breakdown.append(f"Relevant among the last {len(ranker.recent)} scores: "
+                                 f"{ranker.recent_relevance():.0%}")
+            self.progress_bar.setToolTip("\n".join(breakdown))
 
     def load_settings(self):
         # Load button labels and research question from the .ini file if it exists.
         if os.path.exists(config_path):
-            config = configparser.ConfigParser()
+            config = configparser.ConfigParser(interpolation=None)  # Terms and questions may contain "%"
             config.read(config_path)
 
             # Load button labels
             if 'ButtonLabels' in config:
-                button_texts = [config['ButtonLabels'].get(f'button_{i+1}', '') for i in range(5)]
+                keys = [key for key in config['ButtonLabels'] if key.startswith('button_') and key[7:].isdigit()]
+                button_texts = [config['ButtonLabels'][key] for key in sorted(keys, key=lambda key: int(key[7:]))]
                 self.update_button_texts([text for text in button_texts if text])
 
+            # Load whether papers can have several labels
+            if 'Coding' in config:
+                self.set_multi_label(config['Coding'].getboolean('multi_label', fallback=False))
+
             # Load research question
             if 'ResearchQuestion' in config:
                 rq_text = config['ResearchQuestion'].get('rq_text', 'Initial Text 3')
                 self.update_rq_text(rq_text)
 
+            # Load the highlighting terms
+            if 'Highlighting' in config:
+                try:
+                    self.update_highlight_terms(config['Highlighting'].get('include', ''),
+                                                config['Highlighting'].get('exclude', ''))
+                except re.error as e:
+                    QMessageBox.warning(self, "Invalid Term", f"Invalid regular expression in settings.ini: {str(e)}")
+
+            # Load the seed for the row order, leave empty for a fresh random order every time
+            if 'Queue' in config:
+                seed = config['Queue'].get('seed', '').strip()
+                self.queue_seed = seed if seed else None
+
+            # Load the options for large files
+            if 'Loading' in config:
+                self.column_projection = config['Loading'].getboolean('column_projection', fallback=False)
+                self.string_dtype = config['Loading'].getboolean('string_dtype', fallback=False)
+
+            # Load the output column for imported bibliography files
+            if 'Import' in config:
+                self.import_output_column = config['Import'].get('output_column', 'Label').strip() or 'Label'
+
+            # Load the SQLite store options
+            if 'Storage' in config:
+                self.sqlite_store = config['Storage'].getboolean('sqlite', fallback=False)
+                self.sqlite_wal = config['Storage'].getboolean('wal', fallback=True)
+
+            # Load the relevance ranking options
+            if 'Ranking' in config:
+                self.ranking_enabled = config['Ranking'].getboolean('enabled', fallback=False)
+                self.relevant_labels = [label.strip() for label in config['Ranking'].get('relevant', '').split(',')
+                                        if label.strip()]
+
+            # Load the near-duplicate detection options
+            if 'Deduplication' in config:
+                self.deduplicate = config['Deduplication'].getboolean('enabled', fallback=False)
+                self.duplicate_threshold = config['Deduplication'].getfloat('threshold', fallback=0.8)
+
+            # Load the last session, it is reopened on startup unless restore is switched off
+            if 'Session' in config:
+                section = config['Session']
+                self.restore_session = section.getboolean('restore', fallback=True)
+                selection = (section.get('title', ''), section.get('abstract', ''), section.get('output', ''))
+                if section.get('file') and all(selection):
+                    row = section.get('row', '')
+                    # Row keys of CSV files are positions, other keys are kept as text
+                    row = int(row) if row.lstrip('-').isdigit() else (row or None)
+                    self.last_session = (section['file'], selection, row)
+
+            # Load whether the review's search index is built, it needs memory for very large files
+            if 'Review' in config:
+                self.search_index_enabled = config['Review'].getboolean('index', fallback=True)
+
+            # Load the performance instrumentation options, off unless enabled
+            if 'Performance' in config and config['Performance'].getboolean('enabled', fallback=False):
+                AbstractGrader_perf.enable(capacity=config['Performance'].getint('buffer', fallback=2000),
+                                           trace_memory=config['Performance'].getboolean('memory', fallback=False))
+                self.performance_button.show()
+
+            # Load the reviewer split for screening with several reviewers
+            if 'Reviewers' in config:
+                self.reviewers = config['Reviewers'].getint('reviewers', fallback=1)
+                self.reviewer = config['Reviewers'].getint('reviewer', fallback=1)
+                self.reviewer_overlap = config['Reviewers'].getfloat('overlap', fallback=0.0)
+
+    def save_session_settings(self):
+        # Remember the file, its columns and the shown row so the session can be reopened on the next start
+        session = self.session
+        if session is None or session.output_col is None:
+            return
+        config = configparser.ConfigParser(interpolation=None)
+        config.read(config_path)
+        restore = config['Session'].get('restore', 'true') if 'Session' in config else 'true'
+        config['Session'] = {
+            'restore': restore,
+            'file': os.path.abspath(session.file_path),
+            'title': session.title_col,
+            'abstract': session.abstract_col,
+            'output': session.output_col,
+            'row': '' if self.current_row_index is None else str(self.current_row_index),
+        }
+        with open(config_path, 'w') as configfile:
+            config.write(configfile)
+
+    def stop_background_tasks(self):
+        # The ranking is only a convenience, a running save always gets to finish
+        if self.ranker_worker is not None:
+            self.ranker_worker.cancel()
+        if self.dedup_worker is not None:
+            self.dedup_worker.cancel()
+        if self.index_worker is not None:
+            self.index_worker.cancel()
+        QThreadPool.globalInstance().waitForDone()
+
     def closeEvent(self, event):
-        if self.unsaved_changes:
+        if self.session is not None:
+            self.session.journal.sync()  # Make sure every label given so far is on disk
+            self.save_session_settings()
+        if self.save_in_progress and not self.close_after_save:
+            # Let a running save finish before closing, a half-finished one never replaces the original
+            self.close_after_save = True
+            event.ignore()
+        elif self.session is not None and self.session.unsaved_changes and not self.save_in_progress:
             # Show a confirmation dialog to the user
-            reply = QMessageBox.question(self, 'Unsaved Changes',
-                                         'You have unsaved changes. Do you want to save them before exiting?',
-                                         QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel,
-                                         QMessageBox.Save)
+            if self.session.store is not None:
+                # Nothing is lost without saving, every label is already in the store
+                reply = QMessageBox.question(self, 'Unsaved Changes',
+                                             'Your scores are kept in the database, but not saved into the file yet. '
+                                             'Do you want to save them into the file before exiting?',
+                                             QMessageBox.Save | QMessageBox.No | QMessageBox.Cancel,
+                                             QMessageBox.Save)
+            else:
+                reply = QMessageBox.question(self, 'Unsaved Changes',
+                                             'You have unsaved changes. Do you want to save them before exiting? '
+                                             'Scores discarded now are not restored the next time the file is opened.',
+                                             QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel,
+                                             QMessageBox.Save)
             if reply == QMessageBox.Save:
-                self.save_in_progress = True  # Set flag indicating save is in progress
+                self.close_after_save = True  # The window is closed once the save has finished
                 self.save_csv()  # Call the save method
-                if self.save_in_progress:  # Check if save was interrupted
-                    event.ignore()  # Ignore the close event if save was interrupted
-                else:
-                    event.accept()  # Proceed with closing the application if save was successful
+                event.ignore()
             elif reply == QMessageBox.Cancel:
                 event.ignore()  # Ignore the close event if user cancelled
             else:
+                self.cancel_worker()
+                self.stop_background_tasks()
+                if reply == QMessageBox.Discard:
+                    self.session.discard()
                 event.accept()  # Proceed with closing the application if user chose to discard
+        elif self.save_in_progress:
+            event.ignore()  # Still waiting for the save requested on close
         else:
+            self.cancel_worker()  # A file that is still being opened
+            self.stop_background_tasks()
             event.accept()  # Proceed with closing the application if no unsaved changes
 
 # run app
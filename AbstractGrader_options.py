@@ -1,20 +1,26 @@
 import configparser
+import re
 
-from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QDialog, QLineEdit, QTextEdit)
+from AbstractGrader_labels import CodingScheme
+
+from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QDialog, QTextEdit, QMessageBox, QCheckBox)
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont
 
 class OptionsWindow(QDialog):
-    def __init__(self, parent=None, button_texts=None, rq_text=None, config_path = None):
+    def __init__(self, parent=None, button_texts=None, rq_text=None, config_path = None, include_terms="", exclude_terms="",
+                 multi_label=False):
         super().__init__(parent)
         self.setWindowTitle("Options")
         self.initUI()
         self.config_path = config_path
 
         # Pre-fill the inputs with current button labels and research question text
-        for i, text in enumerate(button_texts):
-            self.btntext_inputs[i].setText(text)  # Fill button texts
+        self.btntext_input.setPlainText("\n".join(button_texts))  # Fill button texts, one per line
+        self.multi_label_input.setChecked(multi_label)
         self.rqtext_input.setPlainText(rq_text)  # Fill research question
+        self.include_input.setPlainText(include_terms)  # Fill highlighting terms
+        self.exclude_input.setPlainText(exclude_terms)
 
 
     def initUI(self):
@@ -31,23 +37,41 @@ class OptionsWindow(QDialog):
         self.rqtext_input.setFixedHeight(65)
         main_layout.addWidget(self.rqtext_input)
 
+        # Highlighting Terms Chunk
+        terms_label = QLabel("Highlighted terms (one per line, prefix regular expressions with re:):")
+        terms_label.setFont(QFont("Arial", weight=QFont.Bold))
+        terms_label.setAlignment(Qt.AlignCenter)
+        main_layout.addWidget(terms_label)
+        terms_layout = QHBoxLayout()
+        include_layout = QVBoxLayout()
+        include_layout.addWidget(QLabel("Inclusion terms:"))
+        self.include_input = QTextEdit()
+        self.include_input.setAcceptRichText(False)
+        self.include_input.setFixedHeight(80)
+        include_layout.addWidget(self.include_input)
+        terms_layout.addLayout(include_layout)
+        exclude_layout = QVBoxLayout()
+        exclude_layout.addWidget(QLabel("Exclusion terms:"))
+        self.exclude_input = QTextEdit()
+        self.exclude_input.setAcceptRichText(False)
+        self.exclude_input.setFixedHeight(80)
+        exclude_layout.addWidget(self.exclude_input)
+        terms_layout.addLayout(exclude_layout)
+        main_layout.addLayout(terms_layout)
+
         # Button Text Chunk
-        btn_label = QLabel("Category labels:")
+        btn_label = QLabel("Category labels (one per line, subcategories as Parent/Child):")
         btn_label.setFont(QFont("Arial", weight=QFont.Bold))
         btn_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(btn_label)
 
-        # Create a QHBoxLayout for the text input fields
-        btn_layout = QHBoxLayout()
-        self.btntext_inputs = []
-
-        for _ in range(5):
-            btntext_input = QLineEdit()
-            self.btntext_inputs.append(btntext_input)
-            btn_layout.addWidget(btntext_input)
-
-        # Add the input layout to the main layout
-        main_layout.addLayout(btn_layout)
+        # Any number of categories, one per line
+        self.btntext_input = QTextEdit()
+        self.btntext_input.setAcceptRichText(False)
+        self.btntext_input.setFixedHeight(100)
+        main_layout.addWidget(self.btntext_input)
+        self.multi_label_input = QCheckBox("Allow several labels per paper")
+        main_layout.addWidget(self.multi_label_input)
 
         # Add the "Confirm" button below the input fields
         confirm_button = QPushButton("Confirm")
@@ -56,20 +80,47 @@ class OptionsWindow(QDialog):
         main_layout.addWidget(confirm_button)
 
     def apply_options(self):
+        # Apply the highlighting terms first, invalid regular expressions keep the dialog open
+        include_text = self.include_input.toPlainText()
+        exclude_text = self.exclude_input.toPlainText()
+        try:
+            self.parent().update_highlight_terms(include_text, exclude_text)
+        except re.error as e:
+            QMessageBox.warning(self, "Invalid Term", f"Invalid regular expression: {str(e)}")
+            return
+
         rq_text = self.rqtext_input.toPlainText()
         self.parent().update_rq_text(rq_text)
 
-        btntexts = [btntext_input.text() for btntext_input in self.btntext_inputs]
+        btntexts = [line.strip() for line in self.btntext_input.toPlainText().splitlines()]
         # Filter out empty inputs
         btntexts_nonempty = [text for text in btntexts if text]
+        multi_label = self.multi_label_input.isChecked()
+        if multi_label and len(btntexts_nonempty) > CodingScheme.max_multi_label:
+            QMessageBox.warning(self, "Too Many Labels",
+                                f"At most {CodingScheme.max_multi_label} categories are possible with several labels per paper.")
+            return
+        # Values with several labels have no single-label form, they would turn into bogus categories
+        session = self.parent().session
+        several = session.several_labels() if session is not None else 0
+        if not multi_label and several:
+            QMessageBox.warning(self, "Several Labels",
+                                f"Papers with several labels: {several}. Give them one label each before "
+                                "allowing only one label per paper.")
+            return
         self.parent().update_button_texts(btntexts_nonempty)
+        self.parent().set_multi_label(multi_label)
 
-        # Save to the .ini file
-        config = configparser.ConfigParser()
+        # Save to the .ini file, keeping any other sections already stored there
+        config = configparser.ConfigParser(interpolation=None)  # Terms and questions may contain "%"
+        config.read(self.config_path)
         # Create a section for button labels
-        config['ButtonLabels'] = {f'button_{i+1}': text for i, text in enumerate(btntexts)}
+        config['ButtonLabels'] = {f'button_{i+1}': text for i, text in enumerate(btntexts_nonempty)}
+        config['Coding'] = {'multi_label': str(multi_label).lower()}
         # Add the research question
         config['ResearchQuestion'] = {'rq_text': rq_text}
+        # Add the highlighting terms
+        config['Highlighting'] = {'include': include_text, 'exclude': exclude_text}
         # Write to the settings.ini file
         with open(self.config_path, 'w') as configfile:
             config.write(configfile)
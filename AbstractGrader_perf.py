@@ -0,0 +1,106 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# Opt-in timing of the UI actions. Instrumented methods only check `recorder` while it is None,
+# so the instrumentation costs next to nothing unless it is switched on in settings.ini.
+recorder = None
+
+def _peak_rss():
+    # Peak resident memory of the process in MB, not available on Windows
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+class PerfRecorder:
+    # Rolling buffer of the last `capacity` timed events
+    def __init__(self, capacity=2000, trace_memory=False):
+        self.events = deque(maxlen=capacity)
+        self.trace_memory = trace_memory  # Python heap via tracemalloc, slows everything down noticeably
+        self.origin = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def record(self, name, start, duration):
+        # start is a time.perf_counter() value, duration in seconds
+        event = {"name": name, "start": start - self.origin, "duration": duration,
+                 "thread": threading.get_ident(), "rss_peak_mb": _peak_rss()}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            event["traced_mb"] = current / 1024 ** 2
+            event["traced_peak_mb"] = peak / 1024 ** 2
+        self.events.append(event)
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def clear(self):
+        self.events.clear()
+
+    def summary(self):
+        # Per operation: calls, mean, p50, p95 and max in milliseconds, most expensive in total first
+        durations = {}
+        for event in list(self.events):
+            durations.setdefault(event["name"], []).append(event["duration"] * 1000)
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            rows.append({"name": name, "calls": len(values), "mean": sum(values) / len(values),
+                         "p50": values[len(values) // 2], "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                         "max": values[-1], "total": sum(values)})
+        return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+    def chrome_trace(self):
+        # Chrome trace event format, opens in chrome://tracing or https://ui.perfetto.dev
+        events = []
+        for event in list(self.events):
+            args = {key: value for key, value in event.items() if key.endswith("_mb") and value is not None}
+            events.append({"name": event["name"], "ph": "X", "ts": event["start"] * 1e6, "dur": event["duration"] * 1e6,
+                           "pid": os.getpid(), "tid": event["thread"], "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, file_path):
+        with open(file_path, "w") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+class _Span:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+def enable(capacity=2000, trace_memory=False):
+    global recorder
+    recorder = PerfRecorder(capacity, trace_memory)
+    return recorder
+
+def disable():
+    global recorder
+    recorder = None
+
+def timed(name):
+    # Decorator for methods worth timing, the name is what shows up in the overlay and the trace
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if recorder is None:
+                return method(*args, **kwargs)
+            with recorder.span(name):
+                return method(*args, **kwargs)
+        return wrapper
+    return decorate
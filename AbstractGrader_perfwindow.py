@@ -0,0 +1,88 @@
+from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QDialog, QTableWidget, QTableWidgetItem,
+                               QHeaderView, QFileDialog, QMessageBox)
+from PySide6.QtCore import QTimer
+
+import AbstractGrader_perf
+
+class PerformanceWindow(QDialog):
+    # Small non-modal window with the timings of the recent UI actions, refreshed every second
+    columns = ["Operation", "Calls", "Mean ms", "p50 ms", "p95 ms", "Max ms"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance")
+        self.resize(520, 300)
+        self.initUI()
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def initUI(self):
+        main_layout = QVBoxLayout()
+        self.setLayout(main_layout)
+
+        self.table = QTableWidget(0, len(self.columns))
+        self.table.setHorizontalHeaderLabels(self.columns)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().hide()
+        main_layout.addWidget(self.table)
+
+        self.memory_label = QLabel()
+        main_layout.addWidget(self.memory_label)
+
+        button_layout = QHBoxLayout()
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear)
+        button_layout.addWidget(clear_button)
+        save_button = QPushButton("Save Trace")
+        save_button.clicked.connect(self.save_trace)
+        button_layout.addWidget(save_button)
+        main_layout.addLayout(button_layout)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        recorder = AbstractGrader_perf.recorder
+        if recorder is None:
+            return
+        rows = recorder.summary()
+        self.table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            values = [row["name"], str(row["calls"])] + [f"{row[key]:.2f}" for key in ("mean", "p50", "p95", "max")]
+            for column, value in enumerate(values):
+                self.table.setItem(i, column, QTableWidgetItem(value))
+
+        # Memory as recorded with the most recent event
+        if recorder.events:
+            last = recorder.events[-1]
+            parts = []
+            if last.get("rss_peak_mb") is not None:
+                parts.append(f"Peak memory: {last['rss_peak_mb']:.0f} MB")
+            if "traced_mb" in last:
+                parts.append(f"Python heap: {last['traced_mb']:.1f} MB (peak {last['traced_peak_mb']:.1f} MB)")
+            self.memory_label.setText(", ".join(parts))
+
+    def clear(self):
+        if AbstractGrader_perf.recorder is not None:
+            AbstractGrader_perf.recorder.clear()
+        self.memory_label.setText("")
+        self.refresh()
+
+    def save_trace(self):
+        recorder = AbstractGrader_perf.recorder
+        if recorder is None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Trace", "abstract_grader_trace.json", "Trace Files (*.json)")
+        if file_path:
+            try:
+                recorder.dump(file_path)
+            except OSError as e:
+                QMessageBox.critical(self, "Error", f"Failed to save trace: {str(e)}")
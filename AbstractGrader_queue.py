@@ -0,0 +1,60 @@
+import random
+
+class PendingRows:
+    # Keeps the indices of all ungraded rows in a shuffled array plus a set of those still pending,
+    # so drawing, removing and re-queueing a row are O(1) (amortised) and never touch the DataFrame.
+    def __init__(self, indices, seed=None, all_indices=None):
+        self.seed = seed
+        self._rng = random.Random(seed)
+        # All rows are shuffled, graded or not, and the graded ones left out afterwards. The draw order then
+        # only depends on the seed and the file, so restarting with the same seed after grading some rows
+        # serves the remaining rows in the same order as before.
+        self._rows = list(all_indices if all_indices is not None else indices)
+        self._rng.shuffle(self._rows)
+        if all_indices is not None:
+            pending = set(indices)
+            self._rows = [index for index in self._rows if index in pending]
+        self._pending = set(self._rows)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, index):
+        return index in self._pending
+
+    def peek(self):
+        # The next row is always the last pending element, it stays the same until it is removed.
+        # Removed rows are only dropped from the end of the array once they get there.
+        while self._rows and self._rows[-1] not in self._pending:
+            self._rows.pop()
+        if not self._rows:
+            return None
+        return self._rows[-1]
+
+    def candidates(self, count):
+        # The next `count` rows in the order they will be served
+        rows = []
+        seen = set()  # A re-queued row can still be in the array at its old position
+        for index in reversed(self._rows):
+            if len(rows) >= count:
+                break
+            if index in self._pending and index not in seen:
+                rows.append(index)
+                seen.add(index)
+        return rows
+
+    def remove(self, index):
+        # Removing leaves the order of the other rows as it is, so it stays reproducible
+        if index not in self._pending:
+            return False
+        self._pending.remove(index)
+        return True
+
+    def requeue(self, index):
+        # Put a row back as the next one to serve, e.g. when its label was taken back.
+        # The other rows keep their seeded order.
+        if index in self._pending:
+            return False
+        self._pending.add(index)
+        self._rows.append(index)
+        return True
@@ -0,0 +1,152 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+
+from AbstractGrader_tasks import TaskCancelled, _no_progress, _never_cancelled
+
+class Ranker:
+    # Orders the ungraded rows by predicted relevance. Title and abstract are turned into hashed TF-IDF
+    # features once, stored as flat sparse arrays so all rows can be scored with a few vectorised NumPy calls.
+    # A logistic regression on those features is updated online with every label and retrained in the
+    # background now and then, after which the rows are re-ranked.
+    def __init__(self, index, feature_rows, features, values, n_features, learning_rate=0.5, l2=1e-6):
+        self.index = index  # Row keys, features refer to rows by position
+        self.feature_rows = feature_rows  # Row position of every non-zero feature value
+        self.features = features  # Hashed feature of every non-zero value
+        self.values = values  # L2-normalised TF-IDF values
+        self.n_features = n_features
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.weights = np.zeros(n_features)
+        self.bias = 0.0
+        self.relevant_count = 0
+        self.irrelevant_count = 0
+        self.recent = deque(maxlen=100)  # Outcomes of the last labels, to see when relevant rows run out
+        # Row boundaries in the flat arrays, the arrays are sorted by row
+        self._row_starts = np.searchsorted(feature_rows, np.arange(len(index) + 1))
+        self.order = np.empty(0, dtype=np.int64)  # Row positions by descending score
+        self._cursor = 0
+
+    @classmethod
+    def from_texts(cls, texts, report_progress=_no_progress, is_cancelled=_never_cancelled, n_features=2 ** 18,
+                   chunksize=20000):
+        # texts: one string per row (title and abstract joined), in the order of the DataFrame index
+        index = texts.index
+        texts = texts.fillna("").astype(str).reset_index(drop=True)
+        rows, features, counts = [], [], []
+        for start in range(0, len(texts), chunksize):
+            if is_cancelled():
+                raise TaskCancelled()
+            tokens = texts.iloc[start:start + chunksize].str.lower().str.findall(r"\w\w+").explode().dropna()
+            if len(tokens):
+                hashed = pd.util.hash_array(tokens.to_numpy(dtype=object)) % np.uint64(n_features)
+                keys = tokens.index.to_numpy(dtype=np.int64) * n_features + hashed.astype(np.int64)
+                # Term counts per row, sorted by row and feature
+                keys, key_counts = np.unique(keys, return_counts=True)
+                rows.append((keys // n_features).astype(np.int32))
+                features.append((keys % n_features).astype(np.int32))
+                counts.append(key_counts.astype(np.float32))
+            report_progress(min(start + chunksize, len(texts)), len(texts))
+
+        if rows:
+            feature_rows, features, counts = np.concatenate(rows), np.concatenate(features), np.concatenate(counts)
+        else:
+            feature_rows = features = np.empty(0, dtype=np.int32)
+            counts = np.empty(0, dtype=np.float32)
+        document_frequency = np.bincount(features, minlength=n_features)
+        idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+        values = ((1 + np.log(counts)) * idf[features]).astype(np.float32)
+        norms = np.sqrt(np.bincount(feature_rows, weights=values ** 2, minlength=len(texts)))
+        values /= np.maximum(norms, 1e-12)[feature_rows]
+        return cls(index, feature_rows, features, values, n_features)
+
+    def _row(self, position):
+        start, end = self._row_starts[position], self._row_starts[position + 1]
+        return self.features[start:end], self.values[start:end]
+
+    def _step(self, weights, bias, position, relevant):
+        # One stochastic gradient step of the logistic regression, positives are weighted up
+        # by the class ratio since relevant papers are usually rare
+        features, values = self._row(position)
+        probability = 1 / (1 + np.exp(-(np.dot(weights[features], values) + bias)))
+        error = (1.0 if relevant else 0.0) - probability
+        if relevant:
+            error *= max(1.0, self.irrelevant_count / max(self.relevant_count, 1))
+        weights[features] += self.learning_rate * (error * values - self.l2 * weights[features])
+        return bias + self.learning_rate * error
+
+    def update(self, row, relevant):
+        # Online update with a newly given label
+        if relevant:
+            self.relevant_count += 1
+        else:
+            self.irrelevant_count += 1
+        self.recent.append(relevant)
+        self.bias = self._step(self.weights, self.bias, self.index.get_loc(row), relevant)
+
+    def retrain(self, rows, relevant, report_progress=_no_progress, is_cancelled=_never_cancelled, epochs=5, seed=0):
+        # Several passes over all labelled rows on a copy of the model, then a fresh ranking of all rows.
+        # Safe to run on a worker thread, the result is applied on the GUI thread with apply().
+        positions = self.index.get_indexer(rows)
+        relevant = np.asarray(relevant, dtype=bool)
+        weights, bias = self.weights.copy(), self.bias
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            for i in rng.permutation(len(positions)):
+                bias = self._step(weights, bias, positions[i], relevant[i])
+            if is_cancelled():
+                raise TaskCancelled()
+            report_progress(epoch + 1, epochs + 1)
+        order = np.argsort(-self.scores(weights, bias), kind="stable")
+        report_progress(epochs + 1, epochs + 1)
+        return weights, bias, order
+
+    def scores(self, weights=None, bias=None):
+        # Decision values of all rows at once
+        weights = self.weights if weights is None else weights
+        bias = self.bias if bias is None else bias
+        contributions = weights[self.features] * self.values
+        return np.bincount(self.feature_rows, weights=contributions, minlength=len(self.index)) + bias
+
+    def apply(self, result):
+        self.weights, self.bias, self.order = result
+        self._cursor = 0
+
+    def ready(self):
+        # With no labels or only one class all rows score the same, the ranking says nothing yet
+        return self.relevant_count > 0 and self.irrelevant_count > 0
+
+    def _skip_graded(self, pending):
+        while self._cursor < len(self.order) and self.index[self.order[self._cursor]] not in pending:
+            self._cursor += 1
+
+    def peek(self, pending):
+        # Highest ranked row that is still pending, None if the ranking has no pending rows left
+        self._skip_graded(pending)
+        if self._cursor < len(self.order):
+            return self.index[self.order[self._cursor]]
+        return None
+
+    def candidates(self, count, pending):
+        self._skip_graded(pending)
+        rows = []
+        for position in self.order[self._cursor:]:
+            if len(rows) >= count:
+                break
+            if self.index[position] in pending:
+                rows.append(self.index[position])
+        return rows
+
+    def recent_relevance(self):
+        # Share of relevant rows among the last labels
+        return sum(self.recent) / len(self.recent) if self.recent else None
+
+def train_ranker(titles, abstracts, rows, relevant, report_progress=_no_progress, is_cancelled=_never_cancelled):
+    # Worker task: build the features for all rows and train on the labels given so far
+    ranker = Ranker.from_texts(titles.fillna("").astype(str) + " " + abstracts.fillna("").astype(str),
+                               is_cancelled=is_cancelled)
+    relevant = np.asarray(relevant, dtype=bool)
+    ranker.relevant_count = int(relevant.sum())
+    ranker.irrelevant_count = int(len(relevant) - relevant.sum())
+    ranker.apply(ranker.retrain(rows, relevant, report_progress, is_cancelled))
+    return ranker
@@ -0,0 +1,38 @@
+import html
+from collections import OrderedDict
+
+def render_text(value, highlight=None):
+    # Display text for a title/abstract cell: collapsed whitespace, HTML-escaped for the rich text labels.
+    # highlight can take over the escaping to mark up matches in the text.
+    if not isinstance(value, str):
+        return ""  # Missing values are read as NaN/NA
+    text = " ".join(value.split())
+    if highlight is not None:
+        return highlight(text)
+    return html.escape(text)
+
+class RenderCache:
+    # Small LRU cache of prepared display text per row index, filled ahead of time for the next rows
+    # and kept for the recently shown ones
+    def __init__(self, render, capacity=64):
+        self.render = render
+        self.capacity = capacity
+        self._cache = OrderedDict()
+
+    def get(self, index):
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+        value = self.render(index)
+        self._cache[index] = value
+        if len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+        return value
+
+    def prefetch(self, indices):
+        for index in indices:
+            if index not in self._cache:
+                self.get(index)
+
+    def clear(self):
+        self._cache.clear()
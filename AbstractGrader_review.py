@@ -0,0 +1,94 @@
+import time
+
+from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QDialog, QLineEdit, QComboBox, QListWidget)
+
+class ReviewWindow(QDialog):
+    # Non-modal search over the rows graded so far. Activating a result shows it in the main window,
+    # where its score can be changed like after "Back".
+    max_results = 500
+    time_filters = [("Any time", None), ("Last hour", 3600), ("Last 24 hours", 24 * 3600), ("Last 7 days", 7 * 24 * 3600)]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Review")
+        self.resize(600, 450)
+        self.result_rows = []
+        self.initUI()
+
+    def initUI(self):
+        main_layout = QVBoxLayout()
+        self.setLayout(main_layout)
+
+        filter_layout = QHBoxLayout()
+        self.label_combo = QComboBox()
+        filter_layout.addWidget(self.label_combo)
+        self.time_combo = QComboBox()
+        for text, seconds in self.time_filters:
+            self.time_combo.addItem(text, seconds)
+        filter_layout.addWidget(self.time_combo)
+        main_layout.addLayout(filter_layout)
+
+        query_layout = QHBoxLayout()
+        self.query_input = QLineEdit()
+        self.query_input.setPlaceholderText('Words in title or abstract, "exact phrases" in quotes')
+        self.query_input.returnPressed.connect(self.search)
+        query_layout.addWidget(self.query_input)
+        search_button = QPushButton("Search")
+        search_button.clicked.connect(self.search)
+        query_layout.addWidget(search_button)
+        main_layout.addLayout(query_layout)
+
+        self.result_label = QLabel()
+        main_layout.addWidget(self.result_label)
+        self.results = QListWidget()
+        self.results.itemActivated.connect(self.open_row)
+        main_layout.addWidget(self.results)
+
+    def update_labels(self):
+        # Label filter: all graded rows, ungraded rows, or one category (a parent includes its subcategories)
+        session = self.parent().session
+        current = self.label_combo.currentText()
+        self.label_combo.clear()
+        self.label_combo.addItem("All graded", None)
+        self.label_combo.addItem("Ungraded", None)
+        for parent, categories in session.scheme.groups().items():
+            if parent is not None:
+                self.label_combo.addItem(parent, parent)
+            for category, _ in categories:
+                self.label_combo.addItem(str(category), category)
+        if self.label_combo.findText(current) >= 0:
+            self.label_combo.setCurrentText(current)
+
+    def search(self):
+        session = self.parent().session
+        if session is None or session.scheme is None:
+            return
+        ungraded = self.label_combo.currentText() == "Ungraded"
+        label = self.label_combo.currentData()
+        seconds = self.time_combo.currentData()
+        since = time.time() - seconds if seconds and not ungraded else None
+
+        start = time.perf_counter()
+        rows = session.find(labels=[label] if label is not None else None, query=self.query_input.text().strip(),
+                            since=since, ungraded=ungraded)
+        elapsed = time.perf_counter() - start
+
+        summary = f"{len(rows)} rows ({elapsed * 1000:.0f} ms)"
+        if len(rows) > self.max_results:
+            summary += f", showing the {self.max_results} most recent"
+        self.result_label.setText(summary)
+        self.result_rows = list(rows[:self.max_results])
+        self.results.clear()
+        for row in self.result_rows:
+            label = session.get_label(row)
+            title = session.data.at[row, session.title_col]
+            label_text = session.scheme.to_text(label) if label is not None else "ungraded"
+            self.results.addItem(f"[{label_text}] {title if isinstance(title, str) else ''}")
+
+    def open_row(self, item):
+        self.parent().show_graded_row(self.result_rows[self.results.row(item)])
+
+    def showEvent(self, event):
+        self.update_labels()
+        self.search()
+        super().showEvent(event)
@@ -0,0 +1,75 @@
+import re
+import numpy as np
+import pandas as pd
+
+from AbstractGrader_tasks import TaskCancelled, _no_progress, _never_cancelled
+
+def _bucket(words, n_buckets):
+    return (pd.util.hash_array(np.asarray(words, dtype=object)) % np.uint64(n_buckets)).astype(np.int64)
+
+def parse_query(query):
+    # Words and "quoted phrases" of a search, all of which have to occur. Returns the lower-case words
+    # for the index lookup and one case-insensitive regex per word or phrase to check the text with.
+    phrases = re.findall(r'"([^"]*)"', query)
+    words = re.findall(r"\w+", re.sub(r'"[^"]*"', " ", query))
+    patterns = [re.compile(r"\b" + r"\W+".join(re.findall(r"\w+", phrase)) + r"\b", re.IGNORECASE)
+                for phrase in phrases if re.search(r"\w", phrase)]
+    patterns += [re.compile(r"\b" + re.escape(word) + r"\b", re.IGNORECASE) for word in words]
+    lookup = [word.lower() for word in words] + [word.lower() for phrase in phrases for word in re.findall(r"\w+", phrase)]
+    return list(dict.fromkeys(lookup)), patterns
+
+class SearchIndex:
+    # Inverted index from the words of title and abstract to the rows containing them, in two flat arrays:
+    # the row positions grouped by word and the start of every word's group. Words are hashed into buckets
+    # instead of being stored, so a lookup may return some rows of other words in the same bucket and
+    # the candidates are checked against the text. Only labels change while grading, so it is built once.
+    def __init__(self, offsets, rows, n_buckets):
+        self.offsets = offsets
+        self.rows = rows
+        self.n_buckets = n_buckets
+
+    @classmethod
+    def from_texts(cls, texts, report_progress=_no_progress, is_cancelled=_never_cancelled, n_buckets=2 ** 22,
+                   chunksize=20000):
+        texts = texts.fillna("").astype(str).reset_index(drop=True)
+        buckets, rows = [], []
+        for start in range(0, len(texts), chunksize):
+            if is_cancelled():
+                raise TaskCancelled()
+            tokens = texts.iloc[start:start + chunksize].str.lower().str.findall(r"\w+").explode().dropna()
+            if len(tokens):
+                keys = tokens.index.to_numpy(dtype=np.int64) * n_buckets + _bucket(tokens.to_numpy(), n_buckets)
+                # Every word once per row, sorted by row
+                keys = np.unique(keys)
+                buckets.append((keys % n_buckets).astype(np.uint32))
+                rows.append((keys // n_buckets).astype(np.int32))
+            report_progress(min(start + chunksize, len(texts)), len(texts))
+
+        if buckets:
+            buckets, rows = np.concatenate(buckets), np.concatenate(rows)
+        else:
+            buckets, rows = np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+        # A stable sort keeps the rows of every bucket in ascending order
+        order = np.argsort(buckets, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(buckets, minlength=n_buckets))])
+        return cls(offsets, rows[order], n_buckets)
+
+    def candidates(self, words):
+        # Row positions that may contain all the words
+        result = None
+        for bucket in _bucket(words, self.n_buckets):
+            rows = self.rows[self.offsets[bucket]:self.offsets[bucket + 1]]
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        return result
+
+def matching_rows(texts, patterns):
+    # Which of the texts (a Series) contain all patterns
+    matches = pd.Series(True, index=texts.index)
+    for pattern in patterns:
+        matches &= texts.str.contains(pattern, regex=True)
+    return matches
+
+def build_search_index(titles, abstracts, report_progress=_no_progress, is_cancelled=_never_cancelled):
+    # Worker task: index title and abstract of all rows
+    return SearchIndex.from_texts(titles.fillna("").astype(str) + " " + abstracts.fillna("").astype(str),
+                                  report_progress, is_cancelled)
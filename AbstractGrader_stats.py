@@ -0,0 +1,55 @@
+from collections import Counter
+
+from AbstractGrader_labels import level_separator
+
+def _labels(label):
+    # A row's label(s) as a tuple, papers can have several labels
+    if label is None:
+        return ()
+    return label if isinstance(label, tuple) else (label,)
+
+class GradingStats:
+    # Graded/total and per-label counts, kept up to date as labels are written instead of rescanning the column
+    def __init__(self, total, label_counts=None, graded=None):
+        self.total = total
+        self.label_counts = Counter(label_counts or {})
+        # With several labels per paper the label counts add up to more than the graded rows
+        self.graded = sum(self.label_counts.values()) if graded is None else graded
+
+    @classmethod
+    def from_column(cls, column, scheme=None):
+        # One full scan when a file is loaded, everything after that is incremental
+        if scheme is None:
+            return cls(len(column), column.dropna().value_counts().to_dict())
+        return cls(len(column), scheme.counts(column), int(scheme.graded(column).sum()))
+
+    def record(self, old_label, new_label):
+        # Account for a label change on one row, old_label is None if the row was ungraded
+        for label in _labels(old_label):
+            self.label_counts[label] -= 1
+            if self.label_counts[label] <= 0:
+                del self.label_counts[label]
+        for label in _labels(new_label):
+            self.label_counts[label] += 1
+        self.graded += bool(_labels(new_label)) - bool(_labels(old_label))
+
+    @property
+    def remaining(self):
+        return self.total - self.graded
+
+    def breakdown(self):
+        # Per-category lines for display, most frequent first. Subcategories are listed under
+        # their parent category, which shows the total of its subcategories.
+        totals = Counter()
+        children = {}
+        for label, count in self.label_counts.items():
+            parent = str(label).rpartition(level_separator)[0]
+            totals[parent or label] += count
+            if parent:
+                children.setdefault(parent, []).append((label, count))
+        lines = []
+        for label, count in totals.most_common():
+            lines.append(f"{label}: {count}")
+            for child, child_count in sorted(children.get(label, []), key=lambda item: item[1], reverse=True):
+                lines.append(f"    {child}: {child_count}")
+        return lines
@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import time
+import pandas as pd
+
+from AbstractGrader_io import read_header, read_source_chunks
+from AbstractGrader_journal import GradingJournal
+from AbstractGrader_tasks import TaskCancelled, _no_progress, _never_cancelled
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _signature(file_path):
+    # Size and modification time tell if the source file changed since it was imported
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+class DatasetStore(GradingJournal):
+    # SQLite database next to the source file that holds all its rows (table papers) and every label given
+    # (table labels, keyed by output column and row). The file is imported once, after that a session is
+    # loaded from the database, every label is a committed single-row write and saving exports the rows
+    # with their labels on demand. Several instances can grade the same database: each one picks up the
+    # labels the others wrote with an indexed query on their sequence number (changes()).
+    # It takes the place of the session's GradingJournal, so replay() and label_times() are the same.
+    def __init__(self, path, source_path, wal=True, timeout=30):
+        super().__init__(path)
+        self.source_path = source_path
+        self.timeout = timeout
+        # Created on the loading thread, used on the GUI thread afterwards
+        self.connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        if wal:
+            # Readers and the writer do not block each other, commits only append to the log
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute('CREATE TABLE IF NOT EXISTS labels ("row" INTEGER NOT NULL, "column" TEXT NOT NULL, '
+                                    'label TEXT, time REAL, seq INTEGER, PRIMARY KEY ("column", "row"))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS labels_by_label ON labels ("column", label)')
+            self.connection.execute("CREATE INDEX IF NOT EXISTS labels_by_seq ON labels (seq)")
+        self._seen = 0  # Sequence number up to which changes() has reported labels
+
+    @staticmethod
+    def path_for(source_path):
+        return source_path + ".sqlite"
+
+    @classmethod
+    def open(cls, source_path, wal=True, report_progress=_no_progress, is_cancelled=_never_cancelled):
+        # The store of a file, imported (again) if it does not exist yet or the file changed since
+        store = cls(cls.path_for(source_path), source_path, wal=wal)
+        try:
+            if not store.is_current(source_path):
+                store.import_file(source_path, report_progress, is_cancelled)
+        except BaseException:
+            store.close()
+            raise
+        return store
+
+    def _meta(self, key, connection=None):
+        row = (connection or self.connection).execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key, value, connection=None):
+        (connection or self.connection).execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def is_current(self, source_path, connection=None):
+        return self._meta("source", connection) == _signature(source_path)
+
+    def import_file(self, source_path, report_progress=_no_progress, is_cancelled=_never_cancelled, chunksize=20000,
+                    connection=None):
+        # Copy all rows of the file into the papers table in one transaction, so a cancelled or failed
+        # import leaves the previous state. Labels already in the store are kept, like a journal is.
+        connection = connection or self.connection
+        # Take the write lock first, another instance may be importing the same file right now
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if self.is_current(source_path, connection):
+                connection.rollback()
+                return
+            connection.execute("DROP TABLE IF EXISTS papers")
+            header = None
+            row = 0
+            for chunk in read_source_chunks(source_path, chunksize, report_progress, is_cancelled):
+                if header is None:
+                    header = [str(column) for column in chunk.columns]
+                    columns = ", ".join(_quote(column) for column in header)
+                    connection.execute(f'CREATE TABLE papers ("row" INTEGER PRIMARY KEY, {columns})')
+                    insert = f"INSERT INTO papers VALUES ({', '.join(['?'] * (len(header) + 1))})"
+                # Empty CSV fields are stored as NULL, so they are read back as missing values
+                chunk = chunk.astype(object).where(chunk.notna() & (chunk != ""), None)
+                chunk.index = range(row, row + len(chunk))
+                connection.executemany(insert, chunk.itertuples(name=None))
+                row += len(chunk)
+            if header is None:
+                # Header only
+                header = read_header(source_path)
+                columns = ", ".join(_quote(column) for column in header)
+                connection.execute(f'CREATE TABLE papers ("row" INTEGER PRIMARY KEY, {columns})')
+
+            # Labels that were given before the store was used, and never saved into the file
+            journal = GradingJournal(GradingJournal.path_for(source_path))
+            for record in journal.read():
+                self._write(record["row"], record["column"], record["label"], record.get("time"), connection)
+
+            self._set_meta("header", header, connection)
+            self._set_meta("rows", row, connection)
+            self._set_meta("source", _signature(source_path), connection)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def header(self):
+        return list(self._meta("header") or [])
+
+    def read_data(self, columns=None, dtype=None, report_progress=_no_progress, is_cancelled=_never_cancelled,
+                  chunksize=50000):
+        # The rows of the papers table, optionally only some columns, in the order of the source file
+        header = self.header()
+        columns = header if columns is None else [column for column in dict.fromkeys(columns) if column in header]
+        total = self._meta("rows") or 0
+        selected = ", ".join(['"row"'] + [_quote(column) for column in columns])
+        chunks = []
+        done = 0
+        for chunk in pd.read_sql_query(f'SELECT {selected} FROM papers ORDER BY "row"', self.connection,
+                                       index_col="row", chunksize=chunksize):
+            if is_cancelled():
+                raise TaskCancelled()
+            chunks.append(chunk)
+            done += len(chunk)
+            report_progress(min(done, total), total)
+        report_progress(total, total)
+        data = pd.concat(chunks) if chunks else pd.DataFrame(columns=columns)
+        data = data.reset_index(drop=True)
+        return data.astype(dtype) if dtype is not None else data
+
+    def chunks(self, chunksize=50000):
+        # All columns of all rows for an export. A connection of its own, so the export can run on a worker
+        # thread while labels are written.
+        connection = sqlite3.connect(self.path)
+        try:
+            header = self._meta("header", connection) or []
+            query = f'SELECT {", ".join(_quote(column) for column in header)} FROM papers ORDER BY "row"'
+            for chunk in pd.read_sql_query(query, connection, chunksize=chunksize):
+                yield chunk
+        finally:
+            connection.close()
+
+    def _write(self, row, column, label, label_time=None, connection=None):
+        # Insert or replace the label of one row, with the next sequence number
+        row = row.item() if hasattr(row, "item") else row
+        (connection or self.connection).execute(
+            'INSERT INTO labels VALUES (?, ?, ?, ?, (SELECT IFNULL(MAX(seq), 0) + 1 FROM labels)) '
+            'ON CONFLICT ("column", "row") DO UPDATE SET label = excluded.label, time = excluded.time, seq = excluded.seq',
+            (row, column, label, label_time if label_time is not None else time.time()))
+
+    def read(self):
+        # All labels in the order they were written, as journal records
+        cursor = self.connection.execute('SELECT "row", "column", label, time FROM labels ORDER BY seq')
+        for row, column, label, label_time in cursor:
+            yield {"row": row, "column": column, "label": label, "time": label_time}
+
+    def replay(self, data):
+        # All labels are applied, only those written after the last save over the source file are counted.
+        # Labels written later by other instances are picked up by changes().
+        self._seen = self._last_seq()
+        super().replay(data)
+        saved = self._meta("saved") or 0
+        return self.connection.execute("SELECT COUNT(*) FROM labels WHERE seq > ?", (saved,)).fetchone()[0]
+
+    def columns(self):
+        return [column for column, in self.connection.execute('SELECT DISTINCT "column" FROM labels')]
+
+    def label_times(self, column):
+        return dict(self.connection.execute('SELECT "row", time FROM labels WHERE "column" = ?', (column,)))
+
+    def changes(self, column):
+        # (row, label, time) of the labels written into the column since the last call, by any instance
+        records = self.connection.execute('SELECT "row", label, time, seq FROM labels WHERE seq > ? AND "column" = ? '
+                                          'ORDER BY seq', (self._seen, column)).fetchall()
+        if records:
+            self._seen = records[-1][3]
+        return [record[:3] for record in records]
+
+    def _last_seq(self):
+        return self.connection.execute("SELECT IFNULL(MAX(seq), 0) FROM labels").fetchone()[0]
+
+    def append(self, row, column, label):
+        # Committed right away, which makes the label visible to the other instances
+        with self.connection:
+            self._write(row, column, label)
+
+    def append_many(self, rows, column, labels):
+        # Several labels in one transaction
+        label_time = time.time()
+        with self.connection:
+            for row, label in zip(rows, labels):
+                self._write(row, column, label, label_time)
+
+    def sync(self):
+        pass
+
+    def covers(self, column, values):
+        # Whether exporting the store gives the labels in values (a text column, missing = ungraded):
+        # the labels table over the column as it was imported. Reads the whole column, so it runs on the
+        # saving thread with a connection of its own.
+        labels = {}
+        connection = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            if column in (self._meta("header", connection) or []):
+                labels.update(connection.execute(
+                    f'SELECT "row", {_quote(column)} FROM papers WHERE {_quote(column)} IS NOT NULL'))
+            labels.update(connection.execute('SELECT "row", label FROM labels WHERE "column" = ?', (column,)))
+        finally:
+            connection.close()
+        expected = pd.Series(labels, dtype=object).reindex(values.index)
+        given = values.notna()
+        if not given.equals(expected.notna()):
+            return False
+        return bool((values[given].astype(str) == expected[given].astype(str)).all())
+
+    def import_saved(self, source_path, report_progress=_no_progress):
+        # import_file() for a file that was just saved, on the saving thread with a connection of its own
+        # so the labels written on the GUI thread meanwhile are not part of its transaction
+        connection = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            self.import_file(source_path, report_progress, connection=connection)
+        finally:
+            connection.close()
+
+    def mark(self):
+        return self._last_seq()
+
+    def compact(self, upto=None):
+        # The source file was overwritten with the labels up to upto: remember it as the imported state so it
+        # is not imported again. The labels stay, the store and not the file is what all instances share.
+        # Only valid if the file holds nothing but what the store exports, see covers().
+        with self.connection:
+            self._set_meta("source", _signature(self.source_path))
+            self._set_meta("saved", upto if upto is not None else self._last_seq())
+
+    def close(self):
+        self.connection.close()
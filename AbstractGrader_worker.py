@@ -0,0 +1,37 @@
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from AbstractGrader_tasks import TaskCancelled
+
+class WorkerSignals(QObject):
+    progress = Signal(object, object)  # done, total (can exceed the int range for large files)
+    finished = Signal(object)  # result of the task
+    error = Signal(str)
+    cancelled = Signal()
+
+class Worker(QRunnable):
+    # Runs a task on the QThreadPool. The task receives report_progress and is_cancelled keyword arguments
+    # and its result or error is passed back to the GUI thread through the signals.
+    def __init__(self, task, *args, **kwargs):
+        super().__init__()
+        self.task = task
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        try:
+            result = self.task(*self.args, report_progress=self.signals.progress.emit,
+                               is_cancelled=self.is_cancelled, **self.kwargs)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
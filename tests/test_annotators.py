@@ -0,0 +1,34 @@
+import math
+
+import pandas as pd
+
+from AbstractGrader_annotators import agreement_report, cohen_kappa, fleiss_kappa, merge_reviews
+
+def test_cohen_kappa():
+    a = pd.Series(["Include", "Include", "Exclude", "Exclude", None])
+    b = pd.Series(["Include", "Exclude", "Exclude", "Exclude", "Include"])
+    # Observed agreement 0.75, expected by chance 0.5
+    assert cohen_kappa(a, b) == 0.5
+    assert cohen_kappa(a, a) == 1.0
+    assert math.isnan(cohen_kappa(a, pd.Series([None] * 5)))
+
+def test_fleiss_kappa():
+    agreeing = pd.DataFrame({"r1": ["A", "B", "A"], "r2": ["A", "B", "A"], "r3": ["A", "B", "A"]})
+    assert fleiss_kappa(agreeing) == 1.0
+    disagreeing = pd.DataFrame({"r1": ["A", "B"], "r2": ["B", "A"], "r3": ["A", None]})
+    # Only the first row is graded by everyone
+    assert fleiss_kappa(disagreeing) < 0
+
+def test_merge_copies_with_the_same_name(tmp_path):
+    titles = ["a", "b", "c", "d"]
+    for reviewer, labels in (("r1", ["Include", "Include", "Exclude", "Exclude"]),
+                             ("r2", ["Exclude", "Exclude", "Include", "Include"])):
+        (tmp_path / reviewer).mkdir()
+        pd.DataFrame({"Title": titles, "L": labels}).to_csv(tmp_path / reviewer / "papers.csv", index=False)
+
+    merged, columns = merge_reviews([(str(tmp_path / "r1" / "papers.csv"), "L"),
+                                     (str(tmp_path / "r2" / "papers.csv"), "L")])
+    assert columns == ["L_papers", "L_papers_2"]
+    assert merged["L_papers"].tolist() == ["Include", "Include", "Exclude", "Exclude"]
+    assert merged["L_papers_2"].tolist() == ["Exclude", "Exclude", "Include", "Include"]
+    assert agreement_report(merged, columns) == ["Cohen's kappa L_papers / L_papers_2: -1.000 (4 rows)"]
@@ -0,0 +1,79 @@
+import os
+import stat
+
+import pandas as pd
+import pytest
+
+from AbstractGrader_bibliography import convert_bibliography, is_outdated, set_aside
+
+RIS = """TY  - JOUR
+TI  - Effects of coffee
+  on sleep
+AU  - Doe, Jane
+AU  - Roe, R.
+PY  - 2019/05/01
+AB  - Coffee and
+sleep were studied.
+N2  - same abstract again
+DO  - 10.1000/abc
+ER  - 
+"""
+
+def test_convert_ris(tmp_path):
+    path = tmp_path / "results.ris"
+    path.write_text(RIS, encoding="utf-8")
+    umask = os.umask(0o022)
+    try:
+        csv_path, count = convert_bibliography(str(path))
+    finally:
+        os.umask(umask)
+
+    assert count == 1
+    assert stat.S_IMODE(os.stat(csv_path).st_mode) == 0o644
+    record = pd.read_csv(csv_path).iloc[0]
+    assert record["Title"] == "Effects of coffee on sleep"
+    assert record["Abstract"] == "Coffee and sleep were studied."
+    assert record["Authors"] == "Doe, Jane; Roe, R."
+    assert record["Year"] == 2019
+
+def test_txt_files_must_be_pubmed_exports(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("Some notes\nPMID- 1\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="not a PubMed export"):
+        convert_bibliography(str(path))
+    assert not os.path.exists(str(path) + ".csv")
+
+def test_pubmed_txt(tmp_path):
+    path = tmp_path / "pubmed.txt"
+    path.write_text("\nPMID- 123\nTI  - A title that goes\n      over two lines.\nLID - x [pii]\nLID - 10.1/xyz [doi]\n",
+                    encoding="utf-8")
+    csv_path, count = convert_bibliography(str(path))
+    record = pd.read_csv(csv_path).iloc[0]
+    assert (record["Title"], record["DOI"], record["ID"]) == ("A title that goes over two lines.", "10.1/xyz", 123)
+
+def test_exports_without_records_are_rejected(tmp_path):
+    path = tmp_path / "empty.ris"
+    path.write_text("not a RIS file\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="No records"):
+        convert_bibliography(str(path))
+    assert not os.path.exists(str(path) + ".csv")
+    assert os.listdir(tmp_path) == ["empty.ris"]
+
+def test_changed_export_is_converted_again(tmp_path):
+    path = tmp_path / "results.ris"
+    path.write_text(RIS, encoding="utf-8")
+    csv_path, _ = convert_bibliography(str(path))
+    (tmp_path / "results.ris.csv.journal").write_text("{}\n", encoding="utf-8")
+    assert not is_outdated(str(path))
+
+    # The search was run again and saved under the same name
+    later = os.path.getmtime(csv_path) + 10
+    os.utime(path, (later, later))
+    assert is_outdated(str(path))
+
+    old_path = set_aside(csv_path)
+    assert old_path == str(tmp_path / "results.ris.old.csv")
+    assert os.path.exists(old_path + ".journal")
+    assert not os.path.exists(csv_path) and not os.path.exists(csv_path + ".journal")
+    convert_bibliography(str(path))
+    assert set_aside(csv_path) == str(tmp_path / "results.ris.old2.csv")
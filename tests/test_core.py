@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from AbstractGrader_core import GradingSession
+from AbstractGrader_labels import CodingScheme
+
+@pytest.fixture
+def session(tmp_path):
+    data = pd.DataFrame({"Title": list("abcd"), "Abstract": list("wxyz"), "Out": ["Exclude", None, None, None]})
+    session = GradingSession(data, str(tmp_path / "papers.csv"))
+    session.start("Title", "Abstract", "Out", seed=1)
+    yield session
+    session.close()
+
+def test_duplicates_only_label_ungraded_rows(session):
+    session.set_duplicates([[0, 1, 2]], current_row=1)
+    assert session.duplicates == {1: [2]}
+
+    assert session.label(1, "Include") == [1, 2]
+    assert session.get_label(0) == "Exclude"
+    assert session.get_label(2) == "Include"
+
+def test_duplicates_keep_labels_changed_since(session):
+    session.set_duplicates([[1, 2, 3]], current_row=1)
+    session.label(1, "Include")
+    session.label(3, "Exclude")
+
+    # Changing the shown row again updates the duplicates that still have its old label
+    assert session.label(1, "Exclude") == [1, 2]
+    assert session.get_label(3) == "Exclude"
+    assert session.stats.label_counts == {"Exclude": 4}
+
+def test_discarded_labels_are_not_restored(session):
+    session.label(1, "Include")
+    session.discard()
+    session.close()
+
+    reloaded = GradingSession(session.data.copy(), session.file_path)
+    assert reloaded.restored == 0
+    reloaded.close()
+
+def test_discard_keeps_labels_recovered_from_a_crash(session):
+    data = session.data.copy()
+    session.label(1, "Include")
+    session.close()  # Crashed, never saved
+
+    recovered = GradingSession(data.copy(), session.file_path)
+    recovered.start("Title", "Abstract", "Out", seed=1)
+    assert recovered.restored == 1
+    recovered.label(2, "Exclude")
+    recovered.discard()
+    recovered.close()
+
+    reloaded = GradingSession(data.copy(), session.file_path)
+    assert reloaded.restored == 1
+    assert reloaded.data.at[1, "Out"] == "Include"
+    assert reloaded.data.at[2, "Out"] != "Exclude"
+    reloaded.close()
+
+def test_switching_to_one_label_keeps_several_labels(session):
+    session.set_scheme(CodingScheme(["Include", "Exclude"], multi_label=True))
+    session.label(1, ("Include", "Exclude"))
+    assert session.several_labels() == 1
+
+    with pytest.raises(ValueError):
+        session.set_scheme(CodingScheme(["Include", "Exclude"]))
+    assert session.get_label(1) == ("Include", "Exclude")
+
+    session.label(1, ("Include",))
+    session.set_scheme(CodingScheme(["Include", "Exclude"]))
+    assert session.get_label(1) == "Include"
+    assert session.get_label(0) == "Exclude"
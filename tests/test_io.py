@@ -0,0 +1,32 @@
+import os
+import stat
+
+import pandas as pd
+
+from AbstractGrader_io import write_data_file
+
+def test_saving_over_a_file_keeps_its_permissions(tmp_path):
+    path = str(tmp_path / "papers.csv")
+    pd.DataFrame({"Title": ["a"]}).to_csv(path, index=False)
+    os.chmod(path, 0o644)
+
+    write_data_file(pd.DataFrame({"Title": ["b"]}), path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    assert pd.read_csv(path)["Title"].tolist() == ["b"]
+
+def test_new_files_follow_the_umask(tmp_path):
+    path = str(tmp_path / "new.csv")
+    umask = os.umask(0o022)
+    try:
+        write_data_file(pd.DataFrame({"Title": ["a"]}), path)
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+def test_new_files_leave_the_umask_alone(tmp_path, monkeypatch):
+    # Saves run on worker threads, changing the process umask there affects files created meanwhile
+    def set_umask(mask):
+        raise AssertionError("the umask was changed")
+    monkeypatch.setattr(os, "umask", set_umask)
+    write_data_file(pd.DataFrame({"Title": ["a"]}), str(tmp_path / "new.csv"))
+    assert os.listdir(tmp_path) == ["new.csv"]
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from AbstractGrader_journal import GradingJournal
+
+def test_replay_later_records_win(tmp_path):
+    journal = GradingJournal(str(tmp_path / "papers.csv.journal"))
+    journal.append(0, "Out", "Include")
+    journal.append(1, "Out", "Exclude")
+    journal.append(0, "Out", "Exclude")
+    journal.close()
+
+    data = pd.DataFrame({"Title": ["a", "b", "c"]})
+    assert journal.replay(data) == 2
+    assert list(data["Out"]) == ["Exclude", "Exclude", None]
+
+def test_replay_skips_half_written_line(tmp_path):
+    path = tmp_path / "papers.csv.journal"
+    journal = GradingJournal(str(path))
+    journal.append(0, "Out", "Include")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"row": 1, "col')
+
+    data = pd.DataFrame({"Title": ["a", "b"]})
+    assert journal.replay(data) == 1
+
+def test_append_after_half_written_line(tmp_path):
+    path = tmp_path / "papers.csv.journal"
+    journal = GradingJournal(str(path))
+    journal.append(0, "Out", "Include")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"row": 1, "col')
+
+    # The next session appends after the torn line without losing its first record
+    journal = GradingJournal(str(path))
+    journal.append(2, "Out", "Exclude")
+    journal.append(3, "Out", "Include")
+    journal.close()
+    data = pd.DataFrame({"Title": ["a", "b", "c", "d"]})
+    assert journal.replay(data) == 3
+    assert list(data["Out"]) == ["Include", None, "Exclude", "Include"]
+
+def test_compact_keeps_records_after_mark(tmp_path):
+    path = tmp_path / "papers.csv.journal"
+    journal = GradingJournal(str(path))
+    journal.append(0, "Out", "Include")
+    mark = journal.mark()
+    journal.append(1, "Out", "Exclude")
+    journal.compact(mark)
+
+    assert [(record["row"], record["label"]) for record in journal.read()] == [(1, "Exclude")]
+
+def test_compact_everything_removes_the_file(tmp_path):
+    path = tmp_path / "papers.csv.journal"
+    journal = GradingJournal(str(path))
+    journal.append(0, "Out", "Include")
+    journal.compact(journal.mark())
+
+    assert not path.exists()
+    assert list(journal.read()) == []
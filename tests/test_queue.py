@@ -0,0 +1,47 @@
+from AbstractGrader_queue import PendingRows
+
+def draw(queue, count):
+    rows = []
+    for _ in range(count):
+        row = queue.peek()
+        queue.remove(row)
+        rows.append(row)
+    return rows
+
+def test_seeded_order_survives_a_restart():
+    first = PendingRows(range(20), seed="screening")
+    order = draw(first, 20)
+
+    # Restarting after grading the first five rows serves the rest in the same order
+    graded = set(order[:5])
+    restarted = PendingRows([row for row in range(20) if row not in graded], seed="screening", all_indices=range(20))
+    assert draw(restarted, 15) == order[5:]
+
+def test_removing_keeps_the_order_of_the_other_rows():
+    queue = PendingRows(range(10), seed=3)
+    order = queue.candidates(10)
+    queue.remove(order[4])
+    assert queue.candidates(10) == order[:4] + order[5:]
+    assert len(queue) == 9
+    assert order[4] not in queue
+    assert not queue.remove(order[4])
+
+def test_empty_queue():
+    queue = PendingRows([0], seed=1)
+    queue.remove(0)
+    assert queue.peek() is None
+    assert queue.candidates(3) == []
+
+def test_requeue_serves_the_row_next():
+    queue = PendingRows(range(10), seed=3)
+    order = draw(queue, 3)
+    rest = queue.candidates(10)
+
+    assert queue.requeue(order[1])
+    assert not queue.requeue(order[1])
+    assert queue.peek() == order[1]
+    assert queue.candidates(10) == [order[1]] + rest
+
+    # Once graded again the seeded order continues where it was
+    queue.remove(order[1])
+    assert draw(queue, 7) == rest
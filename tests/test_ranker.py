@@ -0,0 +1,30 @@
+import pandas as pd
+
+from AbstractGrader_core import GradingSession
+from AbstractGrader_ranker import train_ranker
+
+def make_session(tmp_path, labels):
+    data = pd.DataFrame({
+        "Title": [f"paper {i}" for i in range(6)],
+        "Abstract": ["heart attack", "heart failure", "lung cancer", "lung disease", "heart rate", "lung tumour"],
+        "Out": labels,
+    })
+    session = GradingSession(data, str(tmp_path / "papers.csv"))
+    session.start("Title", "Abstract", "Out", seed=7)
+    graded = session.graded_rows()
+    relevant = (session.data.loc[graded, "Out"] == "Include").to_numpy()
+    session.ranker = train_ranker(session.data["Title"], session.data["Abstract"], graded, relevant)
+    return session
+
+def test_one_class_keeps_the_seeded_order(tmp_path):
+    session = make_session(tmp_path, ["Include", None, None, None, None, None])
+    assert not session.ranker.ready()
+    assert session.next_row() == session.pending_rows.peek()
+    assert session.candidates(5) == session.pending_rows.candidates(5)
+    session.close()
+
+def test_both_classes_use_the_ranking(tmp_path):
+    session = make_session(tmp_path, ["Include", None, "Exclude", None, None, None])
+    assert session.ranker.ready()
+    assert session.next_row() == session.ranker.peek(session.pending_rows)
+    session.close()
@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from AbstractGrader_core import GradingSession
+from AbstractGrader_store import DatasetStore
+
+@pytest.fixture
+def papers(tmp_path):
+    path = tmp_path / "papers.csv"
+    pd.DataFrame({"Title": list("abcd"), "Abstract": list("wxyz"), "DOI": ["d0", "d1", "d2", "d3"]}).to_csv(
+        path, index=False)
+    return str(path)
+
+def open_session(file_path):
+    session = GradingSession.load(file_path, store=True)
+    session.start("Title", "Abstract", "Out")
+    return session
+
+def test_labels_are_shared_between_sessions(papers):
+    first, second = open_session(papers), open_session(papers)
+    first.label(0, "Include")
+
+    assert second.refresh() == 1
+    assert second.get_label(0) == "Include"
+    assert second.stats.graded == 1
+    assert 0 not in second.pending_rows
+    first.close()
+    second.close()
+
+def test_save_over_source_keeps_labels(papers):
+    session = open_session(papers)
+    session.label(1, "Exclude")
+    session.save(papers)
+    session.close()
+
+    store = DatasetStore(DatasetStore.path_for(papers), papers)
+    assert store.is_current(papers)
+    store.close()
+    session = open_session(papers)
+    assert session.get_label(1) == "Exclude"
+    assert session.restored == 0
+    session.close()
+
+def test_bulk_labels_go_into_the_store(papers):
+    session = open_session(papers)
+    session.label_many([0, 2], ["Include", "Exclude"], journal=False)
+    session.save(papers)
+    session.close()
+
+    session = open_session(papers)
+    assert session.stats.graded == 2
+    # Saving over the file from a session that gave one more label keeps the bulk labels
+    session.label(3, "Include")
+    session.save(papers)
+    session.close()
+    assert list(pd.read_csv(papers)["Out"].fillna("")) == ["Include", "", "Exclude", "Include"]
+
+def test_file_labels_missing_from_store_are_imported(papers):
+    session = open_session(papers)
+    # A label that did not go through the store
+    session.scheme.set(session.data, "Out", 2, "Include")
+    session.save(papers)
+    session.close()
+
+    session = open_session(papers)
+    assert session.get_label(2) == "Include"
+    session.close()
+
+def test_import_after_save_runs_on_the_saving_thread(papers):
+    session = open_session(papers)
+    session.scheme.set(session.data, "Out", 2, "Include")
+    snapshot, change_count, journal_mark = session.snapshot()
+    # Like the main window: written on a worker thread, the store is checked and imported again there
+    with ThreadPoolExecutor(1) as pool:
+        assert pool.submit(session.write, snapshot, papers).result()
+    session.label(1, "Exclude")
+    session.saved(papers, change_count, journal_mark, imported=True)
+    session.close()
+
+    session = open_session(papers)
+    assert session.get_label(2) == "Include"
+    assert session.get_label(1) == "Exclude"
+    session.close()
+
+def test_changed_source_is_imported_again(papers):
+    open_session(papers).close()
+    data = pd.read_csv(papers)
+    data.loc[0, "Title"] = "changed"
+    data.to_csv(papers, index=False)
+
+    session = open_session(papers)
+    assert session.text(0)[0] == "changed"
+    session.close()